@@ -1,53 +1,33 @@
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
-from flask_login import LoginManager
-from config import Config
+from .extensions import db, bcrypt, login_manager, configure_database, configure_sqlite_engines
+import os
 
-db = SQLAlchemy()
-bcrypt = Bcrypt()
-login_manager = LoginManager()
-login_manager.login_view = 'auth.login'
-login_manager.login_message_category = 'info'
+def create_app(config=None):
+    """Application factory: `flask --app app run`, or `gunicorn -k gevent --preload wsgi:app` (see wsgi.py).
 
-def create_app(config_class=Config):
-    """
-    Creates and configures an instance of the Flask application.
-    This is the application factory.
+    Building the app does no database work, so every worker boots in the time it takes to import
+    the code. Create and seed the schema once with `flask --app app init` (and run
+    `flask --app app upgrade-db` after deploying new migrations).
     """
     app = Flask(__name__)
-    app.config.from_object(config_class)
+    app.config.from_object('app.config.Config')
+    if config:
+        app.config.from_mapping(config)
+    if not app.config['ATTACHMENT_FOLDER']:
+        app.config['ATTACHMENT_FOLDER'] = os.path.join(app.instance_path, 'attachments')
+    configure_database(app)
 
     db.init_app(app)
+    configure_sqlite_engines(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
 
-    from . import models
-
-    @login_manager.user_loader
-    def load_user(user_id):
-        return models.User.query.get(int(user_id))
-
+    # Blueprint modules (and the models and helpers they pull in) are imported here rather than at
+    # package import, so `import app` stays cheap for tools that only need the factory
+    from .instrumentation import bp as instrumentation_bp
     from .auth import bp as auth_bp
-    app.register_blueprint(auth_bp)
-
     from .routes import bp as main_bp
-    app.register_blueprint(main_bp)
-
-    with app.app_context():
-        db.create_all()
-
-        if not models.User.query.filter_by(username='admin').first():
-            admin_user = models.User(
-                username='admin',
-                full_name='Administrator',
-                
-                mobile='0000000000',
-                is_admin=True
-            )
-            admin_user.set_password('admin')
-            db.session.add(admin_user)
-            db.session.commit()
-            print("Default admin user has been created.")
-
-    return app
\ No newline at end of file
+    from .commands import bp as commands_bp
+    for blueprint in (instrumentation_bp, auth_bp, main_bp, commands_bp):
+        app.register_blueprint(blueprint)
+    return app
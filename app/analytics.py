@@ -0,0 +1,172 @@
+from flask import current_app
+import click
+import collections
+import functools
+import datetime
+import numpy as np
+from .extensions import db
+from .models import RollupCursor, SlaRollup, Ticket, TicketEvent
+from .tickets import OPEN_STATUSES, RESOLVED_STATUSES
+
+# --- SLA Analytics ---
+# `flask --app app sla-rollup` folds new ticket_event rows into hourly and daily duration histograms
+# (sla_rollup), so reports merge a few hundred histograms instead of scanning tickets and comments.
+# Percentiles are read off the merged histograms, accurate to the bin width. This is the only module
+# that needs NumPy; the report view and the rollup command import it on first use, so web workers
+# don't pay for NumPy at boot.
+
+SLA_METRICS = ['first_response', 'resolution']
+SLA_GRANULARITIES = {'hour': datetime.timedelta(hours=1), 'day': datetime.timedelta(days=1)}
+
+def event_metric(kind, from_status, to_status):
+    if kind == 'first_response':
+        return 'first_response'
+    if kind == 'status' and to_status in RESOLVED_STATUSES and from_status not in RESOLVED_STATUSES:
+        return 'resolution'
+    return None
+
+@functools.lru_cache(maxsize=None)
+def sla_bin_edges(bins):
+    # Upper edges of bins 0..bins-2; the last bin collects everything past a year
+    return np.geomspace(10, 366 * 86400, bins - 1)
+
+def sla_histogram(seconds):
+    bins = current_app.config['SLA_HISTOGRAM_BINS']
+    return np.bincount(np.searchsorted(sla_bin_edges(bins), seconds, side='right'), minlength=bins).astype('<i8')
+
+def histogram_percentiles(histograms, quantiles):
+    # histograms: (groups, bins) counts -> (groups, len(quantiles)) seconds, NaN where a group is empty.
+    # Interpolates geometrically inside the bin that holds each quantile.
+    histograms = np.atleast_2d(histograms).astype(float)
+    bins = histograms.shape[1]
+    upper = sla_bin_edges(bins)
+    lower = np.concatenate(([upper[0]], upper)) # Placeholder for bin 0, which is interpolated linearly
+    upper = np.concatenate((upper, [upper[-1] * 2]))
+    cumulative = np.cumsum(histograms, axis=1)
+    totals = cumulative[:, -1:]
+    targets = totals * np.asarray(quantiles)[None, :]
+    index = np.minimum((cumulative[:, None, :] < targets[:, :, None]).sum(axis=2), bins - 1)
+    before = np.take_along_axis(np.concatenate((np.zeros_like(totals), cumulative[:, :-1]), axis=1), index, axis=1)
+    in_bin = np.take_along_axis(histograms, index, axis=1)
+    fraction = np.clip(np.divide(targets - before, in_bin, out=np.zeros_like(targets), where=in_bin > 0), 0, 1)
+    # Geometric inside the log-spaced bins, linear inside the first one (which starts at zero)
+    values = np.where(index == 0, upper[0] * fraction, lower[index] * (upper[index] / lower[index]) ** fraction)
+    return np.where(totals > 0, values, np.nan)
+
+def bucket_start(at, granularity):
+    if granularity == 'hour':
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def roll_up_sla_events(batch_size=None):
+    """Folds the next batch of ticket_event rows into sla_rollup. Returns the number of events read."""
+    batch_size = batch_size or current_app.config['SLA_ROLLUP_BATCH_SIZE']
+    with db.engine.begin() as conn:
+        cursor = conn.execute(db.select(RollupCursor.last_id).where(RollupCursor.name == 'sla')).scalar()
+        if cursor is None:
+            conn.execute(db.insert(RollupCursor).values(name='sla', last_id=0))
+            cursor = 0
+        events = conn.execute(db.select(TicketEvent.id, TicketEvent.kind, TicketEvent.from_status,
+                                        TicketEvent.to_status, TicketEvent.category_id, TicketEvent.agent_id,
+                                        TicketEvent.elapsed_seconds, TicketEvent.occurred_at)
+                              .where(TicketEvent.id > cursor).order_by(TicketEvent.id).limit(batch_size)).all()
+        if not events:
+            return 0
+        hourly_cutoff = (bucket_start(datetime.datetime.now(), 'day')
+                         - datetime.timedelta(days=current_app.config['SLA_HOURLY_RETENTION_DAYS']))
+        durations = collections.defaultdict(list)
+        for e in events:
+            metric = event_metric(e.kind, e.from_status, e.to_status)
+            if metric is None:
+                continue
+            for granularity in SLA_GRANULARITIES:
+                start = bucket_start(e.occurred_at, granularity)
+                if granularity == 'hour' and start < hourly_cutoff:
+                    continue
+                for scope, scope_id in (('all', 0), ('category', e.category_id), ('agent', e.agent_id or 0)):
+                    durations[(granularity, metric, scope, scope_id, start)].append(e.elapsed_seconds)
+        # Advancing the cursor conditionally makes a second, concurrent rollup run roll back instead
+        # of counting the same events twice
+        advanced = conn.execute(db.update(RollupCursor)
+                                .where(RollupCursor.name == 'sla', RollupCursor.last_id == cursor)
+                                .values(last_id=events[-1].id))
+        if not advanced.rowcount:
+            raise click.ClickException('Another sla-rollup run advanced the cursor; retry.')
+        # One read of every bucket this batch touches, then batched INSERTs and UPDATEs
+        oldest = bucket_start(min(e.occurred_at for e in events), 'day')
+        existing = {(row.granularity, row.metric, row.scope, row.scope_id, row.bucket_start): row
+                    for row in conn.execute(db.select(SlaRollup).where(SlaRollup.bucket_start >= oldest))}
+        inserts, updates = [], []
+        for key, seconds in durations.items():
+            seconds = np.asarray(seconds)
+            histogram = sla_histogram(seconds)
+            values = dict(zip(('k_granularity', 'k_metric', 'k_scope', 'k_scope_id', 'k_bucket_start'), key),
+                          count=len(seconds), total_seconds=float(seconds.sum()))
+            row = existing.get(key)
+            if row:
+                histogram += np.frombuffer(row.histogram, dtype='<i8')
+                values.update(count=row.count + values['count'], total_seconds=row.total_seconds + values['total_seconds'])
+            values['histogram'] = histogram.tobytes()
+            (updates if row else inserts).append(values)
+        if inserts:
+            conn.execute(db.insert(SlaRollup).values(
+                granularity=db.bindparam('k_granularity'), metric=db.bindparam('k_metric'),
+                scope=db.bindparam('k_scope'), scope_id=db.bindparam('k_scope_id'),
+                bucket_start=db.bindparam('k_bucket_start')), inserts)
+        if updates:
+            conn.execute(db.update(SlaRollup).where(
+                SlaRollup.granularity == db.bindparam('k_granularity'), SlaRollup.metric == db.bindparam('k_metric'),
+                SlaRollup.scope == db.bindparam('k_scope'), SlaRollup.scope_id == db.bindparam('k_scope_id'),
+                SlaRollup.bucket_start == db.bindparam('k_bucket_start')), updates)
+        conn.execute(db.delete(SlaRollup).where(SlaRollup.granularity == 'hour', SlaRollup.bucket_start < hourly_cutoff))
+    return len(events)
+
+def sla_report(since, until, scope='all', quantiles=(0.5, 0.9, 0.95)):
+    """First-response and resolution percentiles per scope id and per bucket, plus open backlog age."""
+    granularity = 'hour' if until - since <= datetime.timedelta(days=2) else 'day'
+    since = bucket_start(since, granularity)
+    report = {'granularity': granularity, 'since': since, 'until': until, 'scope': scope, 'quantiles': list(quantiles)}
+    for metric in SLA_METRICS:
+        rows = db.session.execute(db.select(SlaRollup.scope_id, SlaRollup.bucket_start, SlaRollup.count,
+                                            SlaRollup.total_seconds, SlaRollup.histogram)
+                                  .where(SlaRollup.granularity == granularity, SlaRollup.metric == metric,
+                                         SlaRollup.scope == scope, SlaRollup.bucket_start >= since,
+                                         SlaRollup.bucket_start < until)
+                                  .order_by(SlaRollup.scope_id, SlaRollup.bucket_start)).all()
+        if not rows:
+            report[metric] = {'overall': {}, 'series': []}
+            continue
+        histograms = np.frombuffer(b''.join(row.histogram for row in rows), dtype='<i8').reshape(len(rows), -1)
+        scope_ids, group = np.unique([row.scope_id for row in rows], return_inverse=True)
+        merged = np.zeros((len(scope_ids), histograms.shape[1]), dtype=np.int64)
+        np.add.at(merged, group, histograms)
+        counts = np.bincount(group, weights=[row.count for row in rows])
+        totals = np.bincount(group, weights=[row.total_seconds for row in rows])
+        overall = histogram_percentiles(merged, quantiles)
+        series = histogram_percentiles(histograms, quantiles)
+        report[metric] = {
+            'overall': {int(scope_id): {'count': int(counts[i]), 'mean': float(totals[i] / counts[i]),
+                                        'percentiles': overall[i].tolist()}
+                        for i, scope_id in enumerate(scope_ids)},
+            'series': [{'scope_id': row.scope_id, 'bucket_start': row.bucket_start, 'count': row.count,
+                        'percentiles': series[i].tolist()} for i, row in enumerate(rows)],
+        }
+    report['backlog_age'] = backlog_age(scope, quantiles)
+    return report
+
+def backlog_age(scope, quantiles):
+    # Age of currently open tickets; reads only open rows through ix_ticket_status_category_updated
+    group_column = {'all': db.literal(0), 'category': Ticket.category_id,
+                    'agent': db.func.coalesce(Ticket.assigned_agent_id, 0)}[scope]
+    rows = db.session.execute(db.select(group_column, Ticket.created_at)
+                              .where(Ticket.status.in_(OPEN_STATUSES))).all()
+    if not rows:
+        return {}
+    now = np.datetime64(datetime.datetime.now())
+    scope_ids, group = np.unique([row[0] for row in rows], return_inverse=True)
+    ages = (now - np.array([row[1] for row in rows], dtype='datetime64[us]')) / np.timedelta64(1, 's')
+    order = np.argsort(group, kind='stable')
+    splits = np.flatnonzero(np.diff(group[order])) + 1
+    return {int(scope_id): {'count': len(chunk), 'oldest': float(chunk.max()),
+                            'percentiles': np.quantile(chunk, quantiles).tolist()}
+            for scope_id, chunk in zip(scope_ids, np.split(ages[order], splits))}
@@ -0,0 +1,67 @@
+import datetime
+from .extensions import db
+from .models import ArchivedComment, ArchivedTicket, Comment, NotificationOutbox, Ticket, TicketVote
+from .caches import bump_cache_version
+
+# --- Ticket Archive ---
+# Closed tickets untouched for ARCHIVE_AFTER_DAYS move with their comments from ticket/comment to
+# ticket_archive/comment_archive, keeping their ids, so the working tables and their indexes only hold
+# live tickets. ticket and comment are AUTOINCREMENT, so an archived id is never handed out again.
+# `flask --app app archive-tickets` moves them ARCHIVE_BATCH_SIZE at a time, one short transaction per
+# batch, so writers wait for at most one batch. Archived tickets are read-only:
+# ticket_detail, its comment thread, attachment downloads and search resolve them from the archive
+# tables, and the dashboards list them only with ?archived=1. Their ticket_stat counts, event log,
+# attachments and search documents stay as they are; per-user vote rows are dropped (the totals stay
+# on the ticket).
+
+TICKET_ARCHIVE_COLUMNS = [column.name for column in Ticket.__table__.columns]
+COMMENT_ARCHIVE_COLUMNS = [column.name for column in Comment.__table__.columns]
+
+def archivable_tickets(cutoff):
+    return [Ticket.status == 'Closed', Ticket.updated_at < cutoff]
+
+def archive_ticket_batch(cutoff, batch_size):
+    """Moves up to batch_size archivable tickets and their comments; returns (tickets, comments) moved."""
+    conditions = archivable_tickets(cutoff)
+    # FOR UPDATE SKIP LOCKED (ignored by SQLite) keeps tickets being edited right now out of the batch
+    candidates = db.session.execute(db.select(Ticket.id).where(*conditions).limit(batch_size)
+                                    .with_for_update(skip_locked=True)).scalars().all()
+    if not candidates:
+        return 0, 0
+    # The conditions are checked again by the statement that takes the write lock, so a ticket
+    # reopened since the SELECT stays where it is
+    moved = (db.select(*(Ticket.__table__.c[name] for name in TICKET_ARCHIVE_COLUMNS),
+                       db.literal(datetime.datetime.now()).label('archived_at'))
+             .where(Ticket.id.in_(candidates), *conditions))
+    ticket_ids = db.session.execute(
+        db.insert(ArchivedTicket).from_select(TICKET_ARCHIVE_COLUMNS + ['archived_at'], moved)
+        .returning(ArchivedTicket.id)).scalars().all()
+    if not ticket_ids:
+        db.session.rollback()
+        return 0, 0
+    comments = db.session.execute(db.insert(ArchivedComment).from_select(
+        COMMENT_ARCHIVE_COLUMNS,
+        db.select(*(Comment.__table__.c[name] for name in COMMENT_ARCHIVE_COLUMNS))
+        .where(Comment.ticket_id.in_(ticket_ids)))).rowcount
+    db.session.execute(db.delete(TicketVote).where(TicketVote.ticket_id.in_(ticket_ids)))
+    db.session.execute(db.update(NotificationOutbox).where(NotificationOutbox.ticket_id.in_(ticket_ids))
+                       .values(ticket_id=None))
+    db.session.execute(db.delete(Comment).where(Comment.ticket_id.in_(ticket_ids)))
+    db.session.execute(db.delete(Ticket).where(Ticket.id.in_(ticket_ids)))
+    bump_cache_version('tickets') # Dashboard ETags: removing rows does not move max(updated_at)
+    db.session.commit()
+    return len(ticket_ids), comments
+
+def locate_ticket(ticket_id):
+    """Returns (model, row with user_id, updated_at and modified_at) for a live or archived ticket, or (None, None).
+
+    modified_at is when the page last changed: updated_at, or archived_at once the ticket is archived
+    (archiving leaves updated_at alone but turns the page read-only).
+    """
+    for model in (Ticket, ArchivedTicket):
+        modified_at = model.archived_at if model is ArchivedTicket else model.updated_at
+        state = (db.session.query(model.user_id, model.updated_at, modified_at.label('modified_at'))
+                 .filter(model.id == ticket_id).first())
+        if state is not None:
+            return model, state
+    return None, None
@@ -0,0 +1,81 @@
+from flask import current_app, request
+from flask_login import current_user
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+import hashlib
+import mimetypes
+import tempfile
+import os
+from .extensions import db
+from .models import Attachment
+
+# --- Attachments ---
+# Uploads are copied to disk in ATTACHMENT_CHUNK_SIZE pieces while being hashed, so worker memory
+# stays flat whatever the file size. The finished file is renamed to blobs/<aa>/<bb>/<sha256>;
+# if that blob already exists the upload is dropped and only a new Attachment row is written.
+# Deleting a comment deletes its Attachment rows in the same transaction; once that commits, blobs
+# no row references any more are removed from disk.
+
+def attachment_path(sha256):
+    return os.path.join(current_app.config['ATTACHMENT_FOLDER'], 'blobs', sha256[:2], sha256[2:4], sha256)
+
+def store_attachment(file_storage, ticket_id, comment_id=None):
+    tmp_dir = os.path.join(current_app.config['ATTACHMENT_FOLDER'], 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir) # Same filesystem as the blobs, so the final move is a rename
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(current_app.config['ATTACHMENT_CHUNK_SIZE'])
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > current_app.config['ATTACHMENT_MAX_SIZE']:
+                    raise RequestEntityTooLarge(f'Attachments are limited to {current_app.config["ATTACHMENT_MAX_SIZE"] // (1024 * 1024)} MB.')
+                digest.update(chunk)
+                out.write(chunk)
+        sha256 = digest.hexdigest()
+        blob_path = attachment_path(sha256)
+        if os.path.exists(blob_path):
+            os.remove(tmp_path) # Duplicate content, keep the existing blob
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(tmp_path, blob_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    filename = secure_filename(file_storage.filename) or 'attachment'
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    attachment = Attachment(ticket_id=ticket_id, comment_id=comment_id, uploaded_by=current_user.id,
+                            sha256=sha256, filename=filename, content_type=content_type, size=size)
+    db.session.add(attachment)
+    return attachment
+
+def store_uploaded_attachments(ticket_id, comment_id=None):
+    return [store_attachment(file_storage, ticket_id, comment_id)
+            for file_storage in request.files.getlist('attachment') if file_storage.filename]
+
+def delete_comment_attachments(comment_id):
+    """Deletes a comment's Attachment rows and returns the hashes of blobs nothing else references."""
+    hashes = set(db.session.execute(db.delete(Attachment).where(Attachment.comment_id == comment_id)
+                                    .returning(Attachment.sha256)).scalars())
+    if not hashes:
+        return []
+    still_used = set(db.session.execute(db.select(Attachment.sha256).where(Attachment.sha256.in_(hashes))
+                                        .distinct()).scalars())
+    return sorted(hashes - still_used)
+
+def remove_unreferenced_blobs(hashes):
+    # Call after the deleting transaction commits. Each hash is checked again, so a blob re-uploaded
+    # in the meantime is kept.
+    for sha256 in hashes:
+        if db.session.execute(db.select(Attachment.id).where(Attachment.sha256 == sha256).limit(1)).first():
+            continue
+        try:
+            os.remove(attachment_path(sha256))
+        except FileNotFoundError:
+            pass
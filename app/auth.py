@@ -1,67 +1,62 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
+from .extensions import db, login_manager
 from .models import User
-from . import db
-
-bp = Blueprint('auth', __name__, url_prefix='/auth')
+from .caches import user_cache
 
+# --- Authentication ---
+bp = Blueprint('auth', __name__)
 
 @bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
     if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-        full_name = request.form.get('full_name')
-        address = request.form.get('address')
-        pincode = request.form.get('pincode')
-        mobile = request.form.get('mobile')
-
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists. Please choose a different one.', 'danger')
-        elif User.query.filter_by(mobile=mobile).first():
-            flash('That mobile number is already registered.', 'danger')
+        username = request.form['username']
+        email = request.form['email']
+        password = request.form['password']
+        existing_user = User.query.filter_by(username=username).first()
+        existing_email = User.query.filter_by(email=email).first()
+        if existing_user:
+            flash('Username already taken. Please choose a different one.', 'danger')
+        elif existing_email:
+            flash('Email already registered. Please use a different email.', 'danger')
         else:
-            new_user = User(
-                username=username,
-                full_name=full_name,
-                address=address,
-                pincode=pincode,
-                mobile=mobile
-            )
-            new_user.set_password(password)
-            db.session.add(new_user)
+            user = User(username=username, email=email, role='end_user')
+            user.set_password(password)
+            db.session.add(user)
             db.session.commit()
-            flash('Your account has been created! You are now able to log in.', 'success')
+            flash('Account created successfully! Please log in.', 'success')
             return redirect(url_for('auth.login'))
-
-    return render_template('register.html', title='Register')
-
+    return render_template('auth/register.html')
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
     if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-        user = User.query.filter_by(username=username).first()
-
+        email = request.form['email']
+        password = request.form['password']
+        user = User.query.filter_by(email=email).first()
         if user and user.check_password(password):
-            login_user(user, remember=True)
+            if user.password_needs_rehash():
+                user.set_password(password) # Bring the stored hash up to the configured bcrypt cost
+                db.session.commit()
+            login_user(user)
+            flash(f'Welcome back, {user.username}!', 'success')
             next_page = request.args.get('next')
-            flash('Logged in successfully!', 'success')
-            return redirect(next_page) if next_page else redirect(url_for('main.index'))
+            return redirect(next_page or url_for('main.index'))
         else:
-            flash('Login unsuccessful. Please check your username and password.', 'danger')
-
-    return render_template('login.html', title='Login')
-
+            flash('Login Unsuccessful. Please check email and password', 'danger')
+    return render_template('auth/login.html')
 
 @bp.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('main.index'))
\ No newline at end of file
+    return redirect(url_for('main.index'))
+
+@login_manager.user_loader
+def load_user(user_id):
+    return user_cache.load(int(user_id))
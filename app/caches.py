@@ -0,0 +1,144 @@
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
+import collections
+import threading
+import time
+from .extensions import db
+from .models import CacheVersion, Category, User
+
+# --- In-Process Caches ---
+# Hot, rarely changing rows are cached per worker. Writers bump a named stamp in cache_version
+# inside their own transaction; every worker compares the stamp (a single primary-key read, at
+# most once per check interval) and drops its copy when the stamp moved.
+
+def bump_cache_version(name):
+    db.session.execute(db.update(CacheVersion).where(CacheVersion.name == name)
+                       .values(version=CacheVersion.version + 1))
+
+class VersionStamp:
+    def __init__(self, name, interval_setting):
+        self.name = name
+        self.interval_setting = interval_setting
+        self._version = None
+        self._checked_at = 0.0
+
+    def poll(self):
+        # Returns the last known version, re-reading the row once the check interval has elapsed
+        now = time.monotonic()
+        if self._version is None or now - self._checked_at >= current_app.config[self.interval_setting]:
+            self._version = db.session.query(CacheVersion.version).filter_by(name=self.name).scalar() or 0
+            self._checked_at = now
+        return self._version
+
+    def reset(self):
+        self._version = None
+
+CategoryEntry = collections.namedtuple('CategoryEntry', ['id', 'name'])
+
+class CategoryRegistry:
+    # Categories change only through add_category/delete_category, so name->id and id->name live in memory
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamp = VersionStamp('categories', 'CATEGORY_CACHE_CHECK_INTERVAL')
+        self._loaded_version = None
+        self._state = ({}, {}) # (id -> CategoryEntry, name -> CategoryEntry), swapped atomically
+
+    def invalidate(self):
+        self._stamp.reset()
+        self._loaded_version = None
+
+    @property
+    def version(self):
+        return self._stamp.poll()
+
+    def _current(self):
+        version = self._stamp.poll()
+        if version == self._loaded_version:
+            return self._state
+        with self._lock:
+            if version != self._loaded_version:
+                entries = [CategoryEntry(row.id, row.name)
+                           for row in db.session.query(Category.id, Category.name).order_by(Category.id)]
+                self._state = ({e.id: e for e in entries}, {e.name: e for e in entries})
+                self._loaded_version = version
+            return self._state
+
+    def all(self):
+        return list(self._current()[0].values())
+
+    def get(self, category_id):
+        return self._current()[0].get(category_id)
+
+    def get_by_name(self, name):
+        return self._current()[1].get(name)
+
+category_registry = CategoryRegistry()
+
+class UserCache:
+    """Bounded LRU/TTL cache of session users for the login_manager user_loader.
+
+    Entries are detached User snapshots that are merged into the request's session without a
+    query. Role changes bump the 'users' stamp, which clears every worker's cache.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamp = VersionStamp('users', 'USER_CACHE_CHECK_INTERVAL')
+        self._seen_version = None
+        self._entries = collections.OrderedDict() # user id -> (snapshot, expires_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    @property
+    def version(self):
+        return self._stamp.poll()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._entries)}
+
+    def load(self, user_id):
+        version = self._stamp.poll()
+        now = time.monotonic()
+        with self._lock:
+            if version != self._seen_version:
+                self._entries.clear()
+                self._seen_version = version
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                snapshot = entry[0]
+            else:
+                self.misses += 1
+                snapshot = None
+        if snapshot is not None:
+            return db.session.merge(snapshot, load=False)
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        # password_hash is left unloaded on purpose: it changes on rehash and is read lazily if ever needed
+        snapshot = User(id=user.id, username=user.username, email=user.email, role=user.role)
+        make_transient_to_detached(snapshot)
+        with self._lock:
+            self._entries[user_id] = (snapshot, now + current_app.config['USER_CACHE_TTL'])
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > current_app.config['USER_CACHE_SIZE']:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return user
+
+user_cache = UserCache()
+
+# Bumped by writes that add or remove tickets without moving max(updated_at) (imports, archival), so the
+# dashboard ETags, which are otherwise keyed on that watermark, still change
+ticket_epoch = VersionStamp('tickets', 'TICKET_EPOCH_CHECK_INTERVAL')
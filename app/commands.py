@@ -0,0 +1,301 @@
+from flask import Blueprint, current_app
+import itertools
+import re
+import click
+import os
+import time
+import datetime
+from .extensions import db
+from .models import ArchivedComment, ArchivedTicket, Category, Comment, Ticket, TicketStat, User
+from .caches import bump_cache_version
+from .pagination import comment_thread_columns, comment_thread_query, keyset_page_query
+from .notifications import MailTransport, deliver_outbox_batch, purge_sent_notifications
+from .search import rebuild_search_index
+from .live import prune_live_events
+from .tickets import expected_ticket_stats
+from .transfer import DataImporter, EXPORT_COLUMNS, export_csv, export_ndjson, read_csv, read_ndjson
+from .archive import archivable_tickets, archive_ticket_batch
+from .migrations import current_schema_version, upgrade_database
+
+# --- CLI Commands ---
+# Run with `flask --app app <command>`. Registered without a group, so they sit at the top level.
+bp = Blueprint('commands', __name__, cli_group=None)
+
+@bp.cli.command('backfill-comment-counts')
+@click.option('--batch-size', default=5000, show_default=True, help='Tickets updated per transaction.')
+def backfill_comment_counts(batch_size):
+    """Recompute Ticket.comment_count from the comment table."""
+    comment_total = (db.select(db.func.count(Comment.id))
+                     .where(Comment.ticket_id == Ticket.id)
+                     .scalar_subquery())
+    max_id = db.session.query(db.func.max(Ticket.id)).scalar() or 0
+    updated = 0
+    # Walk the primary key in ranges so each transaction (and its write lock) stays short
+    for start in range(0, max_id, batch_size):
+        result = db.session.execute(
+            db.update(Ticket)
+            .where(Ticket.id > start, Ticket.id <= start + batch_size)
+            .values(comment_count=comment_total, updated_at=Ticket.updated_at)) # A backfill is not an edit
+        db.session.commit()
+        updated += result.rowcount
+    click.echo(f'Backfilled comment_count for {updated} tickets.')
+
+DEFAULT_CATEGORIES = ['Technical Issue', 'Billing Query', 'Feature Request', 'General Support']
+
+@bp.cli.command('init')
+@click.option('--admin-email', default='admin@quickdesk.com', show_default=True)
+@click.option('--admin-password', default='adminpass', show_default=True, help='**CHANGE THIS** after the first sign-in.')
+def init_command(admin_email, admin_password):
+    """Create or migrate the schema, then add the default admin user and categories if missing.
+
+    Run once per deployment (it is idempotent); workers never touch the schema at startup.
+    """
+    for version, description in upgrade_database():
+        click.echo(f'Applied migration {version}: {description}')
+    if not User.query.filter_by(username='admin').first():
+        admin_user = User(username='admin', email=admin_email, role='admin')
+        admin_user.set_password(admin_password)
+        db.session.add(admin_user)
+        db.session.commit()
+        click.echo(f'Default admin user created: admin/{admin_password}')
+    if not Category.query.first():
+        for cat_name in DEFAULT_CATEGORIES:
+            db.session.add(Category(name=cat_name))
+        bump_cache_version('categories')
+        db.session.commit()
+        click.echo('Default categories created.')
+    click.echo(f'Database is at schema version {current_schema_version()}.')
+
+@bp.cli.command('upgrade-db')
+def upgrade_db():
+    """Apply pending schema migrations."""
+    for version, description in upgrade_database():
+        click.echo(f'Applied migration {version}: {description}')
+    click.echo(f'Database is at schema version {current_schema_version()}.')
+
+def dashboard_query_shapes():
+    # Every filter/sort combination the dashboards can issue, for the first page and a later page,
+    # over the live tickets and (with ?archived=1) the archived ones
+    now = datetime.datetime.now()
+    shapes = []
+    for model, comment_model, suffix in [(Ticket, Comment, ''), (ArchivedTicket, ArchivedComment, ' archived')]:
+        # Archived tickets are all Closed, so the archived views are not filtered by status
+        status_filters = [('', None)] + ([('status', lambda q: q.filter_by(status='Open'))] if model is Ticket else [])
+        category_filters = [('', None), ('category', lambda q: q.filter_by(category_id=1))]
+        assigned_filters = [('', None), ('mine', lambda q, model=model: q.filter(model.assigned_agent_id == 1)),
+                            ('unassigned', lambda q, model=model: q.filter(model.assigned_agent_id.is_(None)))]
+        sorts = {'recently_modified': ([model.updated_at, model.id], [now, 1]),
+                 'most_replied': ([model.comment_count, model.id], [3, 1])}
+
+        for dashboard, base in [('user_dashboard', model.query.filter_by(user_id=1)), ('agent_dashboard', model.query)]:
+            assigned = assigned_filters if dashboard == 'agent_dashboard' else [('', None)]
+            sort_names = sorts if dashboard == 'user_dashboard' else ['recently_modified']
+            for filters in itertools.product(status_filters, category_filters, assigned):
+                query = base
+                for _, apply_filter in filters:
+                    query = apply_filter(query) if apply_filter else query
+                filter_names = '+'.join(name for name, _ in filters if name) or 'none'
+                for sort_name in sort_names:
+                    columns, values = sorts[sort_name]
+                    for page_values in (None, values):
+                        page = 'later page' if page_values else 'first page'
+                        label = f'{dashboard}{suffix} sort={sort_name} filters={filter_names} ({page})'
+                        shapes.append((label, keyset_page_query(query, columns, page_values, limit=26).statement))
+        for page_values in (None, [now, 1]):
+            page = 'earlier page' if page_values else 'newest page'
+            query = comment_thread_query(1, comment_model)
+            shapes.append((f'ticket_detail{suffix} comments ({page})',
+                           keyset_page_query(query, comment_thread_columns(comment_model), page_values, limit=51).statement))
+    return shapes
+
+def explain_query_plan(statement):
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = [compiled.params[name] for name in compiled.positiontup]
+    params = [p.isoformat(' ') if isinstance(p, datetime.datetime) else p for p in params]
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), tuple(params))]
+
+# Shapes allowed to SCAN: with no filter at all, the first page walks ix_*_updated newest-first and
+# stops after LIMIT rows, which is as cheap as a SEARCH. Anything else must SEARCH.
+QUERY_PLAN_ALLOWLIST = {
+    'agent_dashboard sort=recently_modified filters=none (first page)',
+    'agent_dashboard archived sort=recently_modified filters=none (first page)',
+}
+
+def table_scans(plan):
+    # Any SCAN of a ticket/comment table, including "SCAN ticket USING INDEX ...", which walks the whole index
+    return [detail for detail in plan if re.match(r'^SCAN (ticket|comment)(_archive)?\b', detail)]
+
+@bp.cli.command('check-query-plans')
+@click.option('--verbose', is_flag=True, help='Print the plan of every query shape.')
+def check_query_plans(verbose):
+    """Fail if a dashboard query would scan a ticket or comment table (SQLite EXPLAIN QUERY PLAN)."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('check-query-plans reads SQLite EXPLAIN QUERY PLAN output.')
+    failures = 0
+    for label, statement in dashboard_query_shapes():
+        plan = explain_query_plan(statement)
+        if table_scans(plan) and label not in QUERY_PLAN_ALLOWLIST:
+            failures += 1
+            click.echo(f'SCAN       {label}: {plan}')
+        elif verbose:
+            click.echo(f'ok         {label}: {plan}')
+    if failures:
+        raise click.ClickException(f'{failures} query shape(s) scan a table instead of searching an index.')
+    click.echo('All dashboard query shapes search an index.')
+
+@bp.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Deliver what is due now and exit.')
+@click.option('--batch-size', type=int, default=None, help='Overrides OUTBOX_BATCH_SIZE.')
+def outbox_worker(once, batch_size):
+    """Deliver queued email notifications in batches and purge old sent ones."""
+    transport = MailTransport()
+    last_purge = None
+    try:
+        while True:
+            sent, failed = deliver_outbox_batch(transport, batch_size)
+            if sent or failed:
+                click.echo(f'Delivered {sent} notification(s), {failed} failed.')
+                continue
+            # Idle: purge sent rows past their retention, at most once per OUTBOX_PURGE_INTERVAL
+            if last_purge is None or time.monotonic() - last_purge > current_app.config['OUTBOX_PURGE_INTERVAL']:
+                purged = purge_sent_notifications()
+                last_purge = time.monotonic()
+                if purged:
+                    click.echo(f'Purged {purged} sent notification(s).')
+            if once:
+                break
+            time.sleep(current_app.config['OUTBOX_POLL_INTERVAL'])
+    finally:
+        transport.close()
+
+@bp.cli.command('prune-live-events')
+def prune_live_events_command():
+    """Delete live_event rows older than LIVE_EVENT_RETENTION."""
+    pruned = prune_live_events()
+    db.session.commit()
+    click.echo(f'Pruned {pruned} live event(s).')
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from the ticket and comment tables."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('Full-text search requires SQLite FTS5.')
+    with db.engine.begin() as conn:
+        rebuild_search_index(conn)
+        documents = conn.execute(db.text('SELECT count(*) FROM search_index')).scalar()
+    click.echo(f'Indexed {documents} documents.')
+
+@bp.cli.command('reconcile-ticket-stats')
+@click.option('--dry-run', is_flag=True, help='Report drift without correcting it.')
+def reconcile_ticket_stats(dry_run):
+    """Recompute ticket_stat from the ticket table and report drift."""
+    with db.engine.begin() as conn:
+        expected = expected_ticket_stats(conn)
+        stored = {(row.scope, row.scope_id, row.status): row.count for row in conn.execute(db.select(TicketStat))}
+        drift = {key: (stored.get(key, 0), expected.get(key, 0))
+                 for key in set(stored) | set(expected) if stored.get(key, 0) != expected.get(key, 0)}
+        for (scope, scope_id, status), (was, should_be) in sorted(drift.items()):
+            click.echo(f'{scope}:{scope_id} {status}: stored {was}, actual {should_be}')
+        if drift and not dry_run:
+            conn.execute(db.delete(TicketStat))
+            for (scope, scope_id, status), count in expected.items():
+                conn.execute(db.insert(TicketStat).values(scope=scope, scope_id=scope_id, status=status, count=count))
+    if not drift:
+        click.echo('ticket_stat matches the ticket table.')
+    elif dry_run:
+        click.echo(f'{len(drift)} counter(s) drifted (dry run, nothing changed).')
+    else:
+        click.echo(f'Corrected {len(drift)} drifted counter(s).')
+
+@bp.cli.command('sla-rollup')
+@click.option('--once', is_flag=True, help='Fold in the events logged so far and exit.')
+@click.option('--batch-size', type=int, default=None, help='Overrides SLA_ROLLUP_BATCH_SIZE.')
+def sla_rollup(once, batch_size):
+    """Aggregate the ticket event log into hourly and daily SLA buckets."""
+    from .analytics import roll_up_sla_events # Imported on first use; see app/analytics.py
+    while True:
+        processed = roll_up_sla_events(batch_size)
+        if processed:
+            click.echo(f'Rolled up {processed} event(s).')
+        elif once:
+            break
+        else:
+            time.sleep(current_app.config['SLA_ROLLUP_INTERVAL'])
+
+@bp.cli.command('archive-tickets')
+@click.option('--older-than-days', type=int, default=None, help='Overrides ARCHIVE_AFTER_DAYS.')
+@click.option('--batch-size', type=int, default=None, help='Overrides ARCHIVE_BATCH_SIZE.')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches (e.g. for a nightly window).')
+@click.option('--dry-run', is_flag=True, help='Count the archivable tickets without moving them.')
+def archive_tickets(older_than_days, batch_size, max_batches, dry_run):
+    """Move long-closed tickets and their comments to the archive tables, in short batches."""
+    days = older_than_days if older_than_days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    if dry_run:
+        count = db.session.execute(db.select(db.func.count()).select_from(Ticket)
+                                   .where(*archivable_tickets(cutoff))).scalar()
+        click.echo(f'{count} ticket(s) closed before {cutoff:%Y-%m-%d %H:%M} would be archived.')
+        return
+    tickets = comments = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved_tickets, moved_comments = archive_ticket_batch(cutoff, batch_size)
+        if not moved_tickets:
+            break
+        tickets += moved_tickets
+        comments += moved_comments
+        batches += 1
+        time.sleep(current_app.config['ARCHIVE_BATCH_PAUSE']) # Let waiting writers take the lock
+    click.echo(f'Archived {tickets} ticket(s) and {comments} comment(s) in {batches} batch(es).')
+
+@bp.cli.command('export-data')
+@click.argument('output', type=click.Path())
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@click.option('--entity', 'entities', multiple=True, type=click.Choice(list(EXPORT_COLUMNS)),
+              help='Export only these entities (repeatable). Default: all.')
+@click.option('--include-password-hashes', is_flag=True, help='Lets users keep their passwords after an import.')
+def export_data_command(output, fmt, entities, include_password_hashes):
+    """Stream tickets, comments, users and categories to OUTPUT (a file, '-', or a directory for CSV)."""
+    entities = [entity for entity in EXPORT_COLUMNS if not entities or entity in entities]
+    if fmt == 'ndjson':
+        with click.open_file(output, 'w', encoding='utf-8') as f:
+            for line in export_ndjson(entities, include_password_hashes):
+                f.write(line)
+        return
+    os.makedirs(output, exist_ok=True)
+    for entity in entities:
+        with open(os.path.join(output, f'{entity}.csv'), 'w', encoding='utf-8', newline='') as f:
+            for chunk in export_csv(entity, include_password_hashes):
+                f.write(chunk)
+        click.echo(f'Wrote {os.path.join(output, entity)}.csv')
+
+@bp.cli.command('import-data')
+@click.argument('inputs', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--name', default=None, help='Import name for checkpoints and the id map. Default: the first file name.')
+@click.option('--batch-size', type=int, default=None, help='Overrides IMPORT_BATCH_SIZE.')
+@click.option('--max-errors', type=int, default=1000, show_default=True, help='Invalid records tolerated before stopping.')
+def import_data_command(inputs, name, batch_size, max_errors):
+    """Import NDJSON or per-entity CSV exports (categories.csv, users.csv, tickets.csv, comments.csv).
+
+    Rerunning the same command after an interruption resumes after the last committed batch.
+    """
+    streams = []
+    for path in inputs:
+        stem, extension = os.path.splitext(os.path.basename(path))
+        if extension in ('.ndjson', '.jsonl'):
+            streams.append((-1, path, read_ndjson(path)))
+        elif extension == '.csv' and stem in EXPORT_COLUMNS:
+            streams.append((list(EXPORT_COLUMNS).index(stem), path, read_csv(path, stem)))
+        else:
+            raise click.BadParameter(f'{path}: expected .ndjson/.jsonl or one of '
+                                     f"{', '.join(entity + '.csv' for entity in EXPORT_COLUMNS)}")
+    importer = DataImporter(name or os.path.splitext(os.path.basename(inputs[0]))[0], batch_size, max_errors)
+    started = time.monotonic()
+    for _, path, records in sorted(streams, key=lambda stream: stream[0]): # CSV parents first
+        if not importer.run(os.path.basename(path), records):
+            click.echo(f'{path} was already imported as {importer.name!r}; skipping.')
+    for error in importer.errors:
+        click.echo(error, err=True)
+    counts = ', '.join(f'{count} {entity}' for entity, count in importer.imported.items()) or 'nothing'
+    click.echo(f'Imported {counts} in {time.monotonic() - started:.1f}s; {importer.error_count} record(s) rejected.')
@@ -0,0 +1,37 @@
+from flask import current_app, request, session
+import hashlib
+import datetime
+
+# --- Conditional GET ---
+# Views derive an ETag from cheap indexed reads (a ticket's updated_at, or the newest updated_at in a
+# dashboard's scope) plus everything else the page depends on, and answer 304 before doing the real
+# queries or rendering. Pages are per-user, so they are marked private and always revalidated.
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def http_datetime(value):
+    # Timestamps are stored as naive local time
+    return value.astimezone(datetime.timezone.utc).replace(microsecond=0) if value else None
+
+def add_validators(response, etag, last_modified):
+    response = current_app.make_response(response)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = http_datetime(last_modified)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified_response(etag, last_modified):
+    """Returns a 304 response when the client's copy is current, otherwise None."""
+    if '_flashes' in session:
+        return None # A pending flash message must be rendered, not hidden behind a cached page
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+        fresh = http_datetime(last_modified) <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return add_validators(current_app.response_class(status=304), etag, last_modified)
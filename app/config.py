@@ -0,0 +1,68 @@
+import os
+
+class Config:
+    """Default settings; create_app(config) overrides any of them."""
+    SECRET_KEY = 'your_super_secret_key_here' # **CHANGE THIS IN PRODUCTION**
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///quickdesk.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL') # Optional read replica for read-only views
+    REPLICA_STICKY_SECONDS = 5 # After a write, the same browser reads from the primary for this long
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5)) # Persistent connections per worker process
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10)) # Extra connections allowed under bursts
+    DB_POOL_TIMEOUT = 10 # Seconds to wait for a free pooled connection
+    DB_POOL_RECYCLE = 1800 # Seconds before a pooled server connection is replaced
+    SQLITE_BUSY_TIMEOUT = 5000 # Milliseconds a writer waits on a locked SQLite database before failing
+    SQLITE_SYNCHRONOUS = 'NORMAL' # Safe with WAL and far fewer fsyncs than FULL
+    BCRYPT_LOG_ROUNDS = 12 # bcrypt cost; stored hashes with a different cost are upgraded on login
+    PASSWORD_HASH_WORKERS = 2 # Threads dedicated to bcrypt hashing/verification
+    PASSWORD_HASH_QUEUE_LIMIT = 8 # Hash jobs in flight or queued before login/register answer 503
+    TICKETS_PER_PAGE = 25 # Default dashboard page size
+    MAX_TICKETS_PER_PAGE = 100 # Upper bound for the ?per_page= override
+    TICKET_AUTO_ASSIGN = 'off' # 'off' or 'least_loaded' (route new tickets to the agent with the fewest open tickets)
+    CATEGORY_CACHE_CHECK_INTERVAL = 1.0 # Seconds between category version-stamp checks (0 = check on every use)
+    MAIL_BACKEND = 'console' # 'console' prints notifications, 'smtp' delivers them through MAIL_SERVER
+    MAIL_SERVER = 'localhost'
+    MAIL_PORT = 25
+    MAIL_USE_TLS = False
+    MAIL_USERNAME = None
+    MAIL_PASSWORD = None
+    MAIL_DEFAULT_SENDER = 'noreply@quickdesk.com'
+    SUPPORT_NOTIFICATION_EMAIL = 'support@quickdesk.com' # Receives new-ticket notifications
+    OUTBOX_BATCH_SIZE = 50 # Notifications claimed per worker round trip
+    OUTBOX_POLL_INTERVAL = 2.0 # Seconds the worker sleeps when the outbox is empty
+    OUTBOX_MAX_ATTEMPTS = 8 # Deliveries tried before a notification is marked failed
+    OUTBOX_RETRY_BASE = 30 # Seconds before the first retry; doubles on every further attempt
+    OUTBOX_LEASE_SECONDS = 300 # How long a claimed batch is reserved for one worker
+    OUTBOX_SENT_RETENTION_DAYS = 7 # Sent notifications are purged after this many days (None = keep); failed ones are kept
+    OUTBOX_PURGE_INTERVAL = 3600 # Seconds between purges run by an idle outbox-worker
+    ATTACHMENT_FOLDER = None # Content-addressed file store; None = <instance folder>/attachments
+    ATTACHMENT_MAX_SIZE = 500 * 1024 * 1024 # Per-file upload limit in bytes
+    ATTACHMENT_CHUNK_SIZE = 1024 * 1024 # Bytes read per chunk while streaming an upload to disk
+    MAX_CONTENT_LENGTH = 520 * 1024 * 1024 # Whole-request limit enforced by Werkzeug
+    SEARCH_RESULTS_PER_PAGE = 20
+    COMMENTS_PER_PAGE = 50 # Newest comments shown on a ticket page; older ones load on demand
+    LIVE_POLL_INTERVAL = 0.5 # Seconds between each worker's single poll of live_event
+    LIVE_HEARTBEAT = 15 # Seconds between keep-alive comments on idle event streams
+    LIVE_SUBSCRIBER_QUEUE_SIZE = 100 # Undelivered events per client before it is told to reconnect
+    LIVE_REPLAY_SIZE = 1000 # Recent events kept per worker to resume streams from Last-Event-ID
+    LIVE_EVENT_RETENTION = 600 # Seconds live_event rows are kept before being pruned
+    USER_CACHE_SIZE = 1024 # Session users kept by the user_loader cache
+    USER_CACHE_TTL = 60 # Seconds a cached session user is trusted
+    USER_CACHE_CHECK_INTERVAL = 1.0 # Seconds between user version-stamp checks (0 = check on every request)
+    BULK_TICKET_LIMIT = 1000 # Most tickets one bulk operation may change
+    EXPORT_BATCH_SIZE = 1000 # Rows fetched per round trip while streaming an export
+    IMPORT_BATCH_SIZE = 5000 # Records inserted per transaction (and per resumable checkpoint) on import
+    TICKET_EPOCH_CHECK_INTERVAL = 1.0 # Seconds between checks of the 'tickets' stamp bumped by imports
+    ARCHIVE_AFTER_DAYS = 180 # Closed tickets untouched this long are moved to the archive tables
+    ARCHIVE_BATCH_SIZE = 200 # Tickets moved per transaction by archive-tickets
+    ARCHIVE_BATCH_PAUSE = 0.05 # Seconds archive-tickets yields the write lock between batches
+    METRICS_ENABLED = True # Per-endpoint latency, SQL and template timings served at /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') # Bearer token for /metrics; unset = /metrics answers 403
+    METRICS_ALLOW_LOOPBACK = False # Also serve /metrics without a token to 127.0.0.1/::1 (unsafe behind a local reverse proxy)
+    SLOW_REQUEST_LOG_MS = None # Log requests slower than this with their slowest queries (None = off)
+    SLOW_REQUEST_LOGGED_QUERIES = 20 # Statements included in a slow-request log entry
+    QUERY_BUDGET = None # Development aid: raise QueryBudgetExceeded when a request runs more statements
+    SLA_ROLLUP_BATCH_SIZE = 5000 # ticket_event rows folded into the rollups per transaction
+    SLA_ROLLUP_INTERVAL = 60 # Seconds the rollup worker sleeps when it has caught up
+    SLA_HOURLY_RETENTION_DAYS = 14 # Hourly buckets older than this are pruned; daily buckets are kept
+    SLA_HISTOGRAM_BINS = 120 # Log-spaced duration bins per bucket (about 14% wide, 10 seconds to 1 year)
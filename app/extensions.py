@@ -0,0 +1,145 @@
+from flask import current_app, session, g, has_app_context
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
+from flask_bcrypt import Bcrypt
+from flask_login import LoginManager
+from sqlalchemy import event, Select
+from sqlalchemy.engine import make_url
+from werkzeug.exceptions import ServiceUnavailable
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import functools
+import sys
+import threading
+import time
+
+# --- Database Engine Configuration ---
+def database_engine_options(config, url):
+    # In-memory SQLite uses a StaticPool (set by Flask-SQLAlchemy), which takes no pool sizing
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    options = {'pool_size': config['DB_POOL_SIZE'], 'max_overflow': config['DB_MAX_OVERFLOW'],
+               'pool_timeout': config['DB_POOL_TIMEOUT']}
+    if url.get_backend_name() != 'sqlite':
+        options.update(pool_recycle=config['DB_POOL_RECYCLE'], pool_pre_ping=True)
+    return options
+
+def configure_database(app):
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(config, config['SQLALCHEMY_DATABASE_URI'])
+    if config['DATABASE_REPLICA_URL']:
+        config['SQLALCHEMY_BINDS'] = {'replica': {'url': config['DATABASE_REPLICA_URL'],
+                                                  **database_engine_options(config, config['DATABASE_REPLICA_URL'])}}
+
+def configure_sqlite_connection(dbapi_connection, connection_record, busy_timeout, synchronous):
+    # WAL lets readers proceed while a writer commits; busy_timeout makes writers queue instead of
+    # failing immediately with "database is locked"
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+    cursor.execute(f'PRAGMA synchronous={synchronous}')
+    cursor.close()
+
+def configure_sqlite_engines(app):
+    # Listens on this app's own engines (primary and replica) with its settings bound in, so other
+    # engines in the process and connections opened outside an app context are left alone.
+    # Creating the engines opens no connection.
+    with app.app_context():
+        engines = list(db.engines.values())
+    listener = functools.partial(configure_sqlite_connection, busy_timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+                                 synchronous=app.config['SQLITE_SYNCHRONOUS'])
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', listener)
+
+class RoutingSession(FlaskSQLAlchemySession):
+    """Sends SELECTs issued by @read_only views to the 'replica' bind; everything else uses the primary."""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and isinstance(clause, Select) and not self._flushing
+                and 'replica' in self._db.engines and has_app_context() and g.get('read_replica')):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_only(view):
+    # Marks a view whose queries may be served by the read replica. A browser that has just written
+    # keeps reading from the primary for REPLICA_STICKY_SECONDS so it sees its own change.
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = session.get('primary_until', 0) < time.time()
+        return view(*args, **kwargs)
+    return wrapper
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+bcrypt = Bcrypt()
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+
+# --- SQL Helpers ---
+def dialect_insert(model):
+    # INSERT construct with ON CONFLICT support for the primary database
+    # The PostgreSQL dialect module is slow to import, so it is only loaded when it is in use
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+def insert_ignoring_conflicts(model, index_elements, **values):
+    return dialect_insert(model).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+
+# --- Password Hashing ---
+# bcrypt is deliberately slow. Hashing runs on a small dedicated pool (bcrypt releases the GIL)
+# so a login spike can only occupy PASSWORD_HASH_WORKERS cores; once PASSWORD_HASH_QUEUE_LIMIT
+# jobs are waiting, further attempts fail fast with 503 instead of queueing dashboard traffic.
+def hashing_executor(max_workers):
+    # Under wsgi.py's gevent patching a ThreadPoolExecutor's threads are greenlets, and a bcrypt call
+    # would stall every request and stream on the worker; gevent's own pool runs on real OS threads
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey and monkey.is_module_patched('threading'):
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+
+class PasswordHasher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= current_app.config['PASSWORD_HASH_QUEUE_LIMIT']:
+                raise ServiceUnavailable('Too many sign-in requests right now, please try again shortly.',
+                                         retry_after=1)
+            if self._executor is None:
+                self._executor = hashing_executor(current_app.config['PASSWORD_HASH_WORKERS'])
+            self._pending += 1
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def hash(self, password):
+        rounds = current_app.config['BCRYPT_LOG_ROUNDS']
+        return self._run(bcrypt.generate_password_hash, password, rounds).decode('utf-8')
+
+    def verify(self, password_hash, password):
+        return self._run(bcrypt.check_password_hash, password_hash, password)
+
+    @staticmethod
+    def needs_rehash(password_hash):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        try:
+            return int(password_hash.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
+        except (IndexError, ValueError):
+            return True
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,177 @@
+from flask import Blueprint, current_app, request, abort, Response, g, has_request_context
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import collections
+import hmac
+import threading
+import time
+import logging
+from .extensions import password_hasher
+from .caches import user_cache
+from .live import live_broker
+
+# --- Instrumentation ---
+# Every request records its latency, SQL statement count and SQL time (SQLAlchemy cursor events)
+# and the render time of each template it renders. Figures are kept per worker process and served
+# in Prometheus text format at /metrics, so each process is scraped as its own target.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+bp = Blueprint('instrumentation', __name__)
+slow_request_log = logging.getLogger('quickdesk.slow_requests')
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets) # Cumulative, like Prometheus buckets
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class RequestMetrics:
+    """Per-process request, SQL and template figures rendered in Prometheus text format."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = collections.defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = collections.defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.sql_seconds = collections.Counter()
+        self.responses = collections.Counter()
+        self.slow_requests = collections.Counter()
+        self.templates = collections.defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+
+    def record_request(self, endpoint, method, status, seconds, query_count, sql_seconds, slow):
+        with self._lock:
+            self.latency[(endpoint, method)].observe(seconds)
+            self.queries[(endpoint, method)].observe(query_count)
+            self.sql_seconds[(endpoint, method)] += sql_seconds
+            self.responses[(endpoint, method, status)] += 1
+            if slow:
+                self.slow_requests[(endpoint, method)] += 1
+
+    def record_template(self, name, seconds):
+        with self._lock:
+            self.templates[(name,)].observe(seconds)
+
+    def render(self):
+        lines = []
+
+        def labels(names, values, **extra):
+            pairs = list(zip(names, values)) + list(extra.items())
+            return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}' if pairs else ''
+
+        def histogram(name, help_text, label_names, series):
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} histogram'])
+            for key, h in sorted(series.items()):
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f'{name}_bucket{labels(label_names, key, le=bound)} {count}')
+                lines.append(f'{name}_bucket{labels(label_names, key, le="+Inf")} {h.count}')
+                lines.append(f'{name}_sum{labels(label_names, key)} {h.sum}')
+                lines.append(f'{name}_count{labels(label_names, key)} {h.count}')
+
+        def sample(name, help_text, kind, label_names, series):
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'])
+            for key, value in sorted(series.items()):
+                lines.append(f'{name}{labels(label_names, key)} {value}')
+
+        with self._lock:
+            histogram('quickdesk_request_duration_seconds', 'Request latency by endpoint.',
+                      ('endpoint', 'method'), self.latency)
+            histogram('quickdesk_request_sql_queries', 'SQL statements executed per request.',
+                      ('endpoint', 'method'), self.queries)
+            sample('quickdesk_request_sql_seconds_total', 'Time spent executing SQL statements.', 'counter',
+                   ('endpoint', 'method'), self.sql_seconds)
+            sample('quickdesk_responses_total', 'Responses by endpoint and status code.', 'counter',
+                   ('endpoint', 'method', 'status'), self.responses)
+            sample('quickdesk_slow_requests_total', 'Requests slower than SLOW_REQUEST_LOG_MS.', 'counter',
+                   ('endpoint', 'method'), self.slow_requests)
+            histogram('quickdesk_template_render_seconds', 'Template render time.', ('template',), self.templates)
+        cache = user_cache.stats()
+        sample('quickdesk_user_cache_events_total', 'Session user cache lookups and evictions.', 'counter',
+               ('event',), {(kind,): cache[kind] for kind in ('hits', 'misses', 'evictions')})
+        sample('quickdesk_user_cache_entries', 'Users held by the session user cache.', 'gauge', (), {(): cache['size']})
+        sample('quickdesk_password_hash_pending', 'Password hash jobs running or queued.', 'gauge', (),
+               {(): password_hasher.pending})
+        sample('quickdesk_live_subscribers', 'Open /events streams.', 'gauge', (), {(): live_broker.subscriber_count()})
+        return '\n'.join(lines) + '\n'
+
+request_metrics = RequestMetrics()
+
+def instrumented():
+    return has_request_context() and 'request_started' in g
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if not instrumented():
+        return
+    g.query_count += 1
+    budget = current_app.config['QUERY_BUDGET']
+    if budget is not None and g.query_count > budget:
+        raise QueryBudgetExceeded(f'{request.endpoint} ran more than {budget} SQL statements; '
+                                  f'statement {g.query_count}: {statement}')
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if not instrumented() or not conn.info.get('query_started'):
+        return
+    took = time.perf_counter() - conn.info['query_started'].pop()
+    g.sql_seconds += took
+    if current_app.config['SLOW_REQUEST_LOG_MS'] is not None:
+        g.statements.append((took, statement))
+
+@before_render_template.connect
+def start_template_timer(sender, template, context, **extra):
+    if instrumented():
+        g.template_started = time.perf_counter()
+
+@template_rendered.connect
+def stop_template_timer(sender, template, context, **extra):
+    if instrumented() and 'template_started' in g:
+        request_metrics.record_template(template.name or 'inline', time.perf_counter() - g.pop('template_started'))
+
+@bp.before_app_request
+def start_request_timer():
+    if current_app.config['METRICS_ENABLED'] or current_app.config['QUERY_BUDGET'] is not None:
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.sql_seconds = 0.0
+        g.statements = []
+
+@bp.after_app_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    took = time.perf_counter() - g.request_started
+    threshold = current_app.config['SLOW_REQUEST_LOG_MS']
+    slow = threshold is not None and took * 1000 >= threshold
+    if slow:
+        slowest = sorted(g.statements, key=lambda s: s[0], reverse=True)[:current_app.config['SLOW_REQUEST_LOGGED_QUERIES']]
+        slow_request_log.warning('%s %s took %.1f ms: %d queries, %.1f ms in SQL\n%s',
+                                 request.method, request.full_path, took * 1000, g.query_count, g.sql_seconds * 1000,
+                                 '\n'.join(f'  {t * 1000:8.2f} ms  {statement}' for t, statement in slowest))
+    if current_app.config['METRICS_ENABLED']:
+        request_metrics.record_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                                       took, g.query_count, g.sql_seconds, slow)
+    return response
+
+@bp.route('/metrics')
+def metrics():
+    # Closed unless a token is configured: behind a reverse proxy on the same host every public
+    # request arrives from 127.0.0.1, so loopback access is an explicit opt-in
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+    elif not (current_app.config['METRICS_ALLOW_LOOPBACK'] and request.remote_addr in ('127.0.0.1', '::1')):
+        abort(403)
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
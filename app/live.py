@@ -0,0 +1,154 @@
+from flask import current_app
+from flask_login import current_user
+import re
+import collections
+import queue
+import threading
+import time
+import datetime
+import json
+from .extensions import db
+from .models import LiveEvent, Ticket
+
+# --- Live Updates (Server-Sent Events) ---
+# Write routes add a LiveEvent row inside their transaction. Each worker runs one EventBroker
+# thread that polls live_event for new rows and fans them out to in-memory subscriber queues,
+# so DB load is one indexed query per worker per LIVE_POLL_INTERVAL however many clients listen.
+# A client costs a small queue plus a suspended generator. wsgi.py runs the app under gevent
+# (`gunicorn -k gevent --preload wsgi:app`), so idle streams and the broker hold greenlets rather than
+# OS threads; under sync workers every open stream would pin one of the worker's threads.
+# Topics: ticket:<id>, queue:all, queue:unassigned, queue:agent:<id>, queue:user:<owner id>.
+# Rows older than LIVE_EVENT_RETENTION are deleted by the writers themselves (at most once per
+# tenth of the retention per process), so the table stays small whether or not anyone listens;
+# `flask --app app prune-live-events` does the same from cron for deployments with few writes.
+TOPIC_PATTERN = re.compile(r'^(ticket:\d+|queue:(all|unassigned|agent:\d+|user:\d+))$')
+BroadcastEvent = collections.namedtuple('BroadcastEvent', ['id', 'kind', 'topics', 'data'])
+
+def ticket_topics(ticket_id, owner_id, agent_ids):
+    # agent_ids: current (and, on reassignment, previous) assignee; None stands for the unassigned queue
+    topics = [f'ticket:{ticket_id}', 'queue:all', f'queue:user:{owner_id}']
+    for agent_id in dict.fromkeys(agent_ids):
+        topics.append('queue:unassigned' if agent_id is None else f'queue:agent:{agent_id}')
+    return topics
+
+def live_event_values(kind, topics, **payload):
+    return {'kind': kind, 'topics': ' '.join(topics), 'payload': json.dumps(payload, default=str)}
+
+def prune_live_events():
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=current_app.config['LIVE_EVENT_RETENTION'])
+    return db.session.execute(db.delete(LiveEvent).where(LiveEvent.created_at < cutoff)).rowcount
+
+class LiveEventPruner:
+    def __init__(self):
+        self._last_pruned = None
+
+    def maybe_prune(self):
+        # Called by publishers inside their transaction; the DELETE commits with the new event
+        now = time.monotonic()
+        if self._last_pruned is not None and now - self._last_pruned < current_app.config['LIVE_EVENT_RETENTION'] / 10:
+            return
+        self._last_pruned = now
+        prune_live_events()
+
+live_event_pruner = LiveEventPruner()
+
+def publish_event(kind, topics, **payload):
+    db.session.add(LiveEvent(**live_event_values(kind, topics, **payload)))
+    live_event_pruner.maybe_prune()
+
+class Subscription:
+    def __init__(self, topics):
+        self.topics = frozenset(topics)
+        self.queue = queue.Queue(maxsize=current_app.config['LIVE_SUBSCRIBER_QUEUE_SIZE'])
+        self.overflowed = False
+
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True # Slow client; its stream ends and it resumes via Last-Event-ID
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = collections.deque() # Bounded by LIVE_REPLAY_SIZE once the poller starts
+        self._thread = None
+
+    def subscribe(self, topics, last_event_id=None):
+        subscription = Subscription(topics)
+        with self._lock:
+            if self._thread is None:
+                self._recent = collections.deque(maxlen=current_app.config['LIVE_REPLAY_SIZE'])
+                self._thread = threading.Thread(target=self._run, args=(current_app._get_current_object(),),
+                                                name='live-event-broker', daemon=True)
+                self._thread.start()
+            if last_event_id is not None:
+                for event in self._recent:
+                    if event.id > last_event_id and event.topics & subscription.topics:
+                        subscription.offer(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _dispatch(self, rows):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            for row in rows:
+                event = BroadcastEvent(row.id, row.kind, frozenset(row.topics.split()), row.payload)
+                self._recent.append(event)
+                for subscription in subscribers:
+                    if event.topics & subscription.topics:
+                        subscription.offer(event)
+
+    def _run(self, app):
+        with app.app_context():
+            last_id = db.session.query(db.func.max(LiveEvent.id)).scalar() or 0
+            db.session.rollback()
+            while True:
+                time.sleep(app.config['LIVE_POLL_INTERVAL'])
+                try:
+                    rows = (LiveEvent.query.filter(LiveEvent.id > last_id)
+                            .order_by(LiveEvent.id).limit(500).all())
+                    db.session.rollback() # Don't hold a read transaction between polls
+                    if rows:
+                        last_id = rows[-1].id
+                        self._dispatch(rows)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Live event poll failed')
+
+live_broker = EventBroker()
+
+def topic_allowed(topic):
+    if not TOPIC_PATTERN.match(topic):
+        return False
+    if current_user.role in ['support_agent', 'admin']:
+        return True
+    # End users may only follow their own queue and their own tickets
+    if topic == f'queue:user:{current_user.id}':
+        return True
+    if topic.startswith('ticket:'):
+        owner_id = db.session.query(Ticket.user_id).filter(Ticket.id == int(topic.split(':')[1])).scalar()
+        return owner_id == current_user.id
+    return False
+
+def event_stream(subscription, heartbeat):
+    # Runs after the request context is gone, so settings are passed in by the view
+    try:
+        yield 'retry: 3000\n\n'
+        while not subscription.overflowed:
+            try:
+                event = subscription.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield f'id: {event.id}\nevent: {event.kind}\ndata: {event.data}\n\n'
+    finally:
+        live_broker.unsubscribe(subscription)
@@ -0,0 +1,209 @@
+from sqlalchemy.schema import CreateColumn, CreateTable
+import datetime
+from .extensions import db
+from .models import (
+    ArchivedComment, ArchivedTicket, Attachment, CacheVersion, Category, Comment, DataImport, ImportIdMap,
+    LiveEvent, NotificationOutbox, RollupCursor, SchemaMigration, SlaRollup, Ticket, TicketEvent, TicketStat,
+    TicketVote, User)
+from .search import rebuild_search_index
+from .tickets import expected_ticket_stats, ticket_event_seed_rows
+
+# --- Schema Migrations ---
+# Replaces the bare db.create_all(): every migration runs once, in version order, inside its own
+# transaction, and is recorded in schema_migration. Migrations must be idempotent against
+# databases created by older create_all() calls, so they check before creating or altering.
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+def add_missing_columns(conn, model, names):
+    existing = {column['name'] for column in db.inspect(conn).get_columns(model.__tablename__)}
+    table_name = conn.dialect.identifier_preparer.format_table(model.__table__)
+    added = []
+    for name in names:
+        if name not in existing:
+            column_ddl = CreateColumn(model.__table__.c[name]).compile(dialect=conn.dialect)
+            conn.execute(db.text(f'ALTER TABLE {table_name} ADD COLUMN {column_ddl}'))
+            added.append(name)
+    return added
+
+def create_missing_indexes(conn, model, names):
+    for index in model.__table__.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+@migration(1, 'Initial schema')
+def migrate_initial_schema(conn):
+    db.metadata.create_all(conn, tables=[User.__table__, Category.__table__, Ticket.__table__, Comment.__table__])
+
+@migration(2, 'Ticket comment_count and assigned_agent_id')
+def migrate_ticket_counters(conn):
+    if 'comment_count' in add_missing_columns(conn, Ticket, ['comment_count', 'assigned_agent_id']):
+        comment_total = (db.select(db.func.count(Comment.id))
+                         .where(Comment.ticket_id == Ticket.id)
+                         .scalar_subquery())
+        # updated_at is set to itself so its onupdate=now does not fire: filling in a counter is not an edit
+        conn.execute(db.update(Ticket).values(comment_count=comment_total, updated_at=Ticket.updated_at))
+
+@migration(3, 'Composite indexes for dashboard and comment queries')
+def migrate_dashboard_indexes(conn):
+    create_missing_indexes(conn, Ticket, ['ix_ticket_user_updated', 'ix_ticket_user_comment_count',
+                                          'ix_ticket_status_category_updated', 'ix_ticket_category_updated',
+                                          'ix_ticket_assigned_status_updated', 'ix_ticket_updated'])
+    create_missing_indexes(conn, Comment, ['ix_comment_ticket_created', 'ix_comment_user'])
+
+@migration(4, 'Cache version stamps')
+def migrate_cache_versions(conn):
+    CacheVersion.__table__.create(conn, checkfirst=True)
+    if not conn.execute(db.select(CacheVersion.name).where(CacheVersion.name == 'categories')).first():
+        conn.execute(db.insert(CacheVersion).values(name='categories', version=0))
+
+@migration(5, 'User cache version stamp')
+def migrate_user_cache_version(conn):
+    if not conn.execute(db.select(CacheVersion.name).where(CacheVersion.name == 'users')).first():
+        conn.execute(db.insert(CacheVersion).values(name='users', version=0))
+
+@migration(6, 'Per-user ticket votes')
+def migrate_ticket_votes(conn):
+    TicketVote.__table__.create(conn, checkfirst=True)
+
+@migration(7, 'Notification outbox')
+def migrate_notification_outbox(conn):
+    NotificationOutbox.__table__.create(conn, checkfirst=True)
+
+@migration(8, 'Attachments')
+def migrate_attachments(conn):
+    Attachment.__table__.create(conn, checkfirst=True)
+
+@migration(9, 'Full-text search index')
+def migrate_search_index(conn):
+    if conn.dialect.name != 'sqlite':
+        return # FTS5 is SQLite-only; search is disabled on other databases
+    conn.execute(db.text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "title, body, ticket_id UNINDEXED, comment_id UNINDEXED, owner_id UNINDEXED, "
+        "tokenize = 'porter unicode61')"))
+    rebuild_search_index(conn)
+
+@migration(10, 'Live event feed')
+def migrate_live_events(conn):
+    LiveEvent.__table__.create(conn, checkfirst=True)
+
+@migration(11, 'Ticket statistics counters')
+def migrate_ticket_stats(conn):
+    TicketStat.__table__.create(conn, checkfirst=True)
+    conn.execute(db.delete(TicketStat))
+    for (scope, scope_id, status), count in expected_ticket_stats(conn).items():
+        conn.execute(db.insert(TicketStat).values(scope=scope, scope_id=scope_id, status=status, count=count))
+
+@migration(12, 'Ticket event log and SLA rollups')
+def migrate_sla_rollups(conn):
+    add_missing_columns(conn, Ticket, ['first_response_at'])
+    for model in (TicketEvent, SlaRollup, RollupCursor):
+        model.__table__.create(conn, checkfirst=True)
+    if conn.execute(db.select(TicketEvent.id).limit(1)).first():
+        return
+    # Seed the log from existing data: the first reply by someone other than the author, and the
+    # last update of tickets that are already resolved (the closest record of when that happened)
+    first_reply = (db.select(Comment.ticket_id, db.func.min(Comment.created_at).label('at'))
+                   .join(Ticket, Ticket.id == Comment.ticket_id)
+                   .where(Comment.user_id != Ticket.user_id)
+                   .group_by(Comment.ticket_id).subquery())
+    conn.execute(db.update(Ticket).where(Ticket.id == first_reply.c.ticket_id)
+                 .values(first_response_at=first_reply.c.at, updated_at=Ticket.updated_at))
+    rows = conn.execute(db.select(Ticket.id, Ticket.category_id, Ticket.assigned_agent_id, Ticket.status,
+                                  Ticket.created_at, Ticket.updated_at, Ticket.first_response_at)
+                        .where(Ticket.created_at.is_not(None)))
+    events = ticket_event_seed_rows(rows)
+    if events:
+        conn.execute(db.insert(TicketEvent), events)
+
+@migration(13, 'Data import checkpoints and the tickets stamp')
+def migrate_data_import(conn):
+    DataImport.__table__.create(conn, checkfirst=True)
+    ImportIdMap.__table__.create(conn, checkfirst=True)
+    if not conn.execute(db.select(CacheVersion.name).where(CacheVersion.name == 'tickets')).first():
+        conn.execute(db.insert(CacheVersion).values(name='tickets', version=0))
+
+@migration(14, 'Ticket and comment archive tables')
+def migrate_ticket_archive(conn):
+    ArchivedTicket.__table__.create(conn, checkfirst=True)
+    ArchivedComment.__table__.create(conn, checkfirst=True)
+    if conn.dialect.name == 'sqlite':
+        return # SQLite does not enforce the foreign keys (no PRAGMA foreign_keys), so there is nothing to drop
+    # Attachments and the event log keep pointing at a ticket after it moves to ticket_archive
+    inspector = db.inspect(conn)
+    for model in (Attachment, TicketEvent):
+        for foreign_key in inspector.get_foreign_keys(model.__tablename__):
+            if foreign_key['referred_table'] in ('ticket', 'comment') and foreign_key['name']:
+                conn.execute(db.text(f'ALTER TABLE {model.__tablename__} DROP CONSTRAINT {foreign_key["name"]}'))
+
+@migration(15, 'Agent queue index without status')
+def migrate_agent_queue_index(conn):
+    create_missing_indexes(conn, Ticket, ['ix_ticket_assigned_updated'])
+
+@migration(16, 'Status queue index without category')
+def migrate_status_queue_index(conn):
+    create_missing_indexes(conn, Ticket, ['ix_ticket_status_updated'])
+
+def rebuild_with_autoincrement(conn, model, archive_model):
+    # SQLite cannot add AUTOINCREMENT to an existing table, so the table is created again under a
+    # temporary name, filled, and renamed over the old one (the old name is never renamed away, so the
+    # foreign keys that point at it are left alone)
+    table = model.__table__
+    current_ddl = conn.execute(db.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                               {'name': table.name}).scalar()
+    if 'AUTOINCREMENT' in current_ddl.upper():
+        return # Created by migration 1 from a model that already asks for it
+    preparer = conn.dialect.identifier_preparer
+    table_name = preparer.format_table(table)
+    rebuilt_name = preparer.quote(f'{table.name}_rebuild')
+    create_ddl = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    conn.execute(db.text(create_ddl.replace(f'CREATE TABLE {table_name} ', f'CREATE TABLE {rebuilt_name} ', 1)))
+    existing = {column['name'] for column in db.inspect(conn).get_columns(table.name)}
+    columns = ', '.join(preparer.quote(column.name) for column in table.columns if column.name in existing)
+    conn.execute(db.text(f'INSERT INTO {rebuilt_name} ({columns}) SELECT {columns} FROM {table_name}'))
+    conn.execute(db.text(f'DROP TABLE {table_name}'))
+    conn.execute(db.text(f'ALTER TABLE {rebuilt_name} RENAME TO {table_name}'))
+    for index in table.indexes:
+        index.create(conn)
+    # Ids already moved to the archive count as handed out
+    last_id = conn.execute(db.select(db.func.max(db.literal_column('id')))
+                           .select_from(db.union_all(db.select(model.id), db.select(archive_model.id))
+                                        .subquery())).scalar() or 0
+    conn.execute(db.text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table.name})
+    conn.execute(db.text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                 {'name': table.name, 'seq': last_id})
+
+@migration(17, 'Never reuse ticket and comment ids')
+def migrate_autoincrement_ids(conn):
+    # Without AUTOINCREMENT SQLite hands out max(id) + 1, so archiving or deleting the newest row gives
+    # its id to the next one, which then collides with archived comments, their attachments and their
+    # search documents. Other databases' sequences never go back, so there is nothing to do there.
+    if conn.dialect.name != 'sqlite':
+        return
+    rebuild_with_autoincrement(conn, Ticket, ArchivedTicket)
+    rebuild_with_autoincrement(conn, Comment, ArchivedComment)
+
+def current_schema_version():
+    if not db.inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return 0
+    return db.session.query(db.func.max(SchemaMigration.version)).scalar() or 0
+
+def upgrade_database():
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= current_schema_version():
+            continue
+        with db.engine.begin() as conn:
+            fn(conn)
+            conn.execute(db.insert(SchemaMigration).values(version=version, description=description,
+                                                           applied_at=datetime.datetime.now()))
+        applied.append((version, description))
+    return applied
@@ -1,38 +1,280 @@
 from flask_login import UserMixin
-from datetime import datetime
-from . import db, bcrypt
+import datetime
+from .extensions import db, password_hasher
 
+# --- Models ---
+class User(db.Model, UserMixin):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(128), nullable=False)
+    role = db.Column(db.String(20), default='end_user') # 'end_user', 'support_agent', 'admin'
+    tickets = db.relationship('Ticket', backref='author', lazy=True, foreign_keys='Ticket.user_id')
+    assigned_tickets = db.relationship('Ticket', backref='assigned_agent', lazy=True, foreign_keys='Ticket.assigned_agent_id')
+    comments = db.relationship('Comment', backref='comment_author', lazy=True)
+
+    def set_password(self, password):
+        self.password_hash = password_hasher.hash(password)
+
+    def check_password(self, password):
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
+
+    def __repr__(self):
+        return f'<User {self.username}>'
 
 class Category(db.Model):
-    __tablename__='Category'
-    id=db.Column(db.Integer,primary_key=True)
-    name=db.Column(db.String,nullable=False,unique=True)
-class User(db.Model,UserMixin):
-    __tablename__='User'
-    id=db.Column(db.Integer,primary_key=True)
-    username=db.Column(db.String,unique=True,nullable=False)
-    password=db.Column(db.String,nullable=False)
-    role=db.Column(db.String,nullable=False,default='User')
-    category=db.Column(db.Integer,db.ForeignKey(Category.id),nullable=False)
-
-class Tickets(db.Model):
-    __tablename__='Tickets'
-    id=db.Column(db.Integer,Primary_key=True)
-    status=db.Column(db.String,nullable=False,default='Open')
-    category=db.Column(db.String,db.ForeignKey(Category.id),nullable=False)
-    subject=db.Column(db.String,nullable=False)
-    data=db.Column(db.String,nullable=False)
-    vote=db.Column(db.Integer,default=0)
-class Ticket_reply(db.Model):
-    __tablename__='Ticket_reply'
-    prev_id=db.Column(db.Integer,nullable=False)
-    id=db.Column(db.Integer,primary_key=True)
-    data=db.Column(db.String,nullable=False)
-    user=db.column(db.Integer,db.ForeignKey(User.id))
-    votes=db.Column(db.Integer,default=0)
-class Messages(db.Model):
-    __tablename__='Messages'
-    id=db.Column(db.Integer,primary_key=True)
-    data=db.Column(db.String,nullable=False)
-    user=db.Column(db.Integer,db.ForeignKey(User.id),nullable=False)
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), unique=True, nullable=False)
+    tickets = db.relationship('Ticket', backref='category', lazy=True)
+
+    def __repr__(self):
+        return f'<Category {self.name}>'
+
+class Ticket(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='Open') # Open, In Progress, Resolved, Closed
+    assigned_agent_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # NULL = unassigned
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+    upvotes = db.Column(db.Integer, default=0)
+    downvotes = db.Column(db.Integer, default=0)
+    comment_count = db.Column(db.Integer, default=0, server_default='0', nullable=False) # Maintained by add_comment/delete_comment
+    first_response_at = db.Column(db.DateTime, nullable=True) # First comment by someone other than the author
+    comments = db.relationship('Comment', backref='ticket', lazy=True, cascade="all, delete-orphan") # Added cascade
+
+    # Composite indexes matching the dashboard access paths (filter columns first, sort key last)
+    __table_args__ = (
+        db.Index('ix_ticket_user_updated', 'user_id', 'updated_at'),
+        db.Index('ix_ticket_user_comment_count', 'user_id', 'comment_count'),
+        db.Index('ix_ticket_status_category_updated', 'status', 'category_id', 'updated_at'),
+        db.Index('ix_ticket_status_updated', 'status', 'updated_at'), # Status filter without a category
+        db.Index('ix_ticket_category_updated', 'category_id', 'updated_at'),
+        db.Index('ix_ticket_assigned_status_updated', 'assigned_agent_id', 'status', 'updated_at'),
+        db.Index('ix_ticket_assigned_updated', 'assigned_agent_id', 'updated_at'), # mine/unassigned, any status
+        db.Index('ix_ticket_updated', 'updated_at'),
+        # AUTOINCREMENT: ids are never handed out again once the row is archived or deleted
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return f'<Ticket {self.subject}>'
+
+class Comment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    comment_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_comment_ticket_created', 'ticket_id', 'created_at'),
+        db.Index('ix_comment_user', 'user_id'),
+        {'sqlite_autoincrement': True}, # Same as ticket: archived and deleted ids stay retired
+    )
+
+    def __repr__(self):
+        return f'<Comment {self.id}>'
+
+class ArchivedTicket(db.Model):
+    # Closed tickets moved out of ticket by archive-tickets, keeping their ids; read-only from then on
+    __tablename__ = 'ticket_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20))
+    assigned_agent_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    upvotes = db.Column(db.Integer, default=0)
+    downvotes = db.Column(db.Integer, default=0)
+    comment_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    first_response_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+    author = db.relationship('User', foreign_keys=[user_id], viewonly=True)
+    assigned_agent = db.relationship('User', foreign_keys=[assigned_agent_id], viewonly=True)
+    category = db.relationship('Category', viewonly=True)
+
+    # The ticket indexes that serve the dashboards' ?archived=1 views
+    __table_args__ = (
+        db.Index('ix_ticket_archive_user_updated', 'user_id', 'updated_at'),
+        db.Index('ix_ticket_archive_user_comment_count', 'user_id', 'comment_count'),
+        db.Index('ix_ticket_archive_category_updated', 'category_id', 'updated_at'),
+        db.Index('ix_ticket_archive_assigned_updated', 'assigned_agent_id', 'updated_at'),
+        db.Index('ix_ticket_archive_updated', 'updated_at'),
+    )
+
+    def __repr__(self):
+        return f'<ArchivedTicket {self.subject}>'
+
+class ArchivedComment(db.Model):
+    # Comments of archived tickets, moved in the same transaction as their ticket
+    __tablename__ = 'comment_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('ticket_archive.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    comment_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime)
+    comment_author = db.relationship('User', viewonly=True)
+
+    __table_args__ = (
+        db.Index('ix_comment_archive_ticket_created', 'ticket_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<ArchivedComment {self.id}>'
+
+class TicketVote(db.Model):
+    # One row per (user, ticket); Ticket.upvotes/downvotes are the running totals of these rows
+    __tablename__ = 'ticket_vote'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), primary_key=True)
+    value = db.Column(db.SmallInteger, nullable=False) # 1 = upvote, -1 = downvote
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_ticket_vote_ticket', 'ticket_id'),
+    )
+
+class Attachment(db.Model):
+    # Files live once on disk under their SHA-256; each upload adds a row linking that blob to a ticket or comment.
+    # No foreign keys on ticket_id/comment_id: the row stays put when its ticket moves to ticket_archive.
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, nullable=False)
+    comment_id = db.Column(db.Integer, nullable=True) # NULL = attached to the ticket itself
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(120), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_attachment_ticket', 'ticket_id'),
+        db.Index('ix_attachment_comment', 'comment_id'),
+        db.Index('ix_attachment_sha256', 'sha256'),
+    )
+
+    def __repr__(self):
+        return f'<Attachment {self.filename}>'
+
+class NotificationOutbox(db.Model):
+    # Notifications are written in the same transaction as the ticket change and delivered by outbox-worker
+    __tablename__ = 'notification_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=True)
+    dedupe_key = db.Column(db.String(200), nullable=False) # kind:ticket:recipient, pending rows with the same key are merged
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending') # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+    locked_until = db.Column(db.DateTime) # Lease held by the worker currently delivering the row
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_outbox_dedupe_status', 'dedupe_key', 'status'),
+    )
+
+class LiveEvent(db.Model):
+    # Short-lived change feed behind /events, written in the same transaction as the change it describes
+    __tablename__ = 'live_event'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False) # ticket_created, comment, status, assignment
+    topics = db.Column(db.String(255), nullable=False) # Space-separated, e.g. "ticket:7 queue:all queue:user:3"
+    payload = db.Column(db.Text, nullable=False) # JSON
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now, index=True)
+
+class TicketStat(db.Model):
+    # Running ticket counts per status for the admin dashboard, kept in step with every ticket write.
+    # scope 'all' uses scope_id 0; scope 'agent' uses scope_id 0 for unassigned tickets.
+    __tablename__ = 'ticket_stat'
+    scope = db.Column(db.String(20), primary_key=True) # 'all', 'category', 'agent'
+    scope_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class TicketEvent(db.Model):
+    # Append-only log of ticket lifecycle events; the SLA rollup job folds it into sla_rollup
+    __tablename__ = 'ticket_event'
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, nullable=False) # ticket.id or, once archived, ticket_archive.id
+    kind = db.Column(db.String(20), nullable=False) # created, status, first_response
+    from_status = db.Column(db.String(20))
+    to_status = db.Column(db.String(20))
+    category_id = db.Column(db.Integer, nullable=False) # Ticket category and assignee when the event happened
+    agent_id = db.Column(db.Integer)
+    actor_id = db.Column(db.Integer)
+    elapsed_seconds = db.Column(db.Float, nullable=False) # Time since the ticket was created
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_ticket_event_ticket', 'ticket_id', 'occurred_at'),
+    )
+
+class SlaRollup(db.Model):
+    # Duration histograms per metric, scope and time bucket. Primary key columns are ordered so a
+    # report for one metric and scope is a single range scan over bucket_start.
+    __tablename__ = 'sla_rollup'
+    granularity = db.Column(db.String(5), primary_key=True) # hour, day
+    metric = db.Column(db.String(20), primary_key=True) # first_response, resolution
+    scope = db.Column(db.String(20), primary_key=True) # all, category, agent
+    scope_id = db.Column(db.Integer, primary_key=True) # 0 for 'all' and for unassigned tickets
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    histogram = db.Column(db.LargeBinary, nullable=False) # SLA_HISTOGRAM_BINS little-endian int64 counts
+
+    __table_args__ = (
+        db.Index('ix_sla_rollup_bucket', 'bucket_start'), # Lets the rollup job load just the buckets it touches
+    )
+
+class RollupCursor(db.Model):
+    # Last ticket_event id folded into the rollups
+    __tablename__ = 'rollup_cursor'
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+
+class DataImport(db.Model):
+    # Progress of one input file of a named import; committed with every batch so imports can resume
+    __tablename__ = 'data_import'
+    name = db.Column(db.String(100), primary_key=True)
+    stream = db.Column(db.String(255), primary_key=True) # Input file name
+    position = db.Column(db.Integer, nullable=False, default=0) # Records consumed so far
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='running') # running, done
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+class ImportIdMap(db.Model):
+    # Source id -> id in this database for every category, user and ticket an import created or matched
+    __tablename__ = 'import_id_map'
+    import_name = db.Column(db.String(100), primary_key=True)
+    entity = db.Column(db.String(20), primary_key=True)
+    source_id = db.Column(db.Integer, primary_key=True)
+    target_id = db.Column(db.Integer, nullable=False)
+
+class CacheVersion(db.Model):
+    # Version stamps that let every worker detect when a shared in-process cache went stale
+    __tablename__ = 'cache_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migration'
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.datetime.now)
@@ -0,0 +1,132 @@
+from flask import current_app
+from sqlalchemy import or_
+import smtplib
+import uuid
+from email.message import EmailMessage
+import datetime
+from .extensions import db
+from .models import NotificationOutbox
+
+# --- Notification Outbox ---
+# Requests only INSERT into notification_outbox as part of their own transaction, so mail delivery
+# never adds latency to a ticket write and a rolled-back change never sends mail. A separate
+# `flask --app app outbox-worker` process claims due rows in batches, delivers them over one reused
+# SMTP connection and retries failures with exponential backoff. Rows that exhaust
+# OUTBOX_MAX_ATTEMPTS stay behind as status='failed' for inspection; sent rows are purged by the
+# worker once they are older than OUTBOX_SENT_RETENTION_DAYS.
+
+def enqueue_notification(ticket_id, kind, recipient, subject, body):
+    # A still-undelivered notification of the same kind for the same ticket and recipient is
+    # updated in place, so e.g. three quick status changes produce a single email.
+    now = datetime.datetime.now()
+    dedupe_key = f'{kind}:{ticket_id}:{recipient}'
+    merged = db.session.execute(
+        db.update(NotificationOutbox)
+        .where(NotificationOutbox.dedupe_key == dedupe_key,
+               NotificationOutbox.status == 'pending',
+               or_(NotificationOutbox.locked_until.is_(None), NotificationOutbox.locked_until < now))
+        .values(subject=subject, body=body))
+    if not merged.rowcount:
+        db.session.add(NotificationOutbox(ticket_id=ticket_id, dedupe_key=dedupe_key, recipient=recipient,
+                                          subject=subject, body=body, next_attempt_at=now))
+
+class MailTransport:
+    """Keeps one SMTP connection open across batches and reconnects when the server drops it."""
+    def __init__(self):
+        self._smtp = None
+
+    def _connection(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.noop()
+                return self._smtp
+            except smtplib.SMTPException:
+                self.close()
+        smtp = smtplib.SMTP(current_app.config['MAIL_SERVER'], current_app.config['MAIL_PORT'], timeout=30)
+        if current_app.config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if current_app.config['MAIL_USERNAME']:
+            smtp.login(current_app.config['MAIL_USERNAME'], current_app.config['MAIL_PASSWORD'])
+        self._smtp = smtp
+        return smtp
+
+    def send(self, notification):
+        if current_app.config['MAIL_BACKEND'] == 'console':
+            print(f"EMAIL NOTIFICATION to {notification.recipient}: {notification.subject}")
+            return
+        message = EmailMessage()
+        message['From'] = current_app.config['MAIL_DEFAULT_SENDER']
+        message['To'] = notification.recipient
+        message['Subject'] = notification.subject
+        message.set_content(notification.body)
+        self._connection().send_message(message)
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+def claim_outbox_batch(batch_size):
+    # Leases a batch of due rows to this worker so several workers never send the same email
+    now = datetime.datetime.now()
+    token = uuid.uuid4().hex
+    due_ids = (db.select(NotificationOutbox.id)
+               .where(NotificationOutbox.status == 'pending',
+                      NotificationOutbox.next_attempt_at <= now,
+                      or_(NotificationOutbox.locked_until.is_(None), NotificationOutbox.locked_until < now))
+               .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.id)
+               .limit(batch_size))
+    db.session.execute(
+        db.update(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(due_ids),
+               or_(NotificationOutbox.locked_until.is_(None), NotificationOutbox.locked_until < now))
+        .values(claim_token=token,
+                locked_until=now + datetime.timedelta(seconds=current_app.config['OUTBOX_LEASE_SECONDS'])))
+    db.session.commit()
+    return NotificationOutbox.query.filter_by(claim_token=token).order_by(NotificationOutbox.id).all()
+
+def deliver_outbox_batch(transport, batch_size=None):
+    """Delivers one batch of due notifications and returns (sent, failed) counts."""
+    batch = claim_outbox_batch(batch_size or current_app.config['OUTBOX_BATCH_SIZE'])
+    sent = failed = 0
+    for notification in batch:
+        try:
+            transport.send(notification)
+        except (smtplib.SMTPException, OSError) as exc:
+            transport.close()
+            notification.attempts += 1
+            notification.last_error = str(exc)
+            if notification.attempts >= current_app.config['OUTBOX_MAX_ATTEMPTS']:
+                notification.status = 'failed'
+            else:
+                delay = current_app.config['OUTBOX_RETRY_BASE'] * 2 ** (notification.attempts - 1)
+                notification.next_attempt_at = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+            failed += 1
+        else:
+            notification.status = 'sent'
+            notification.sent_at = datetime.datetime.now()
+            sent += 1
+        notification.claim_token = None
+        notification.locked_until = None
+    db.session.commit()
+    return sent, failed
+
+def purge_sent_notifications(chunk_size=1000):
+    """Deletes sent notifications older than OUTBOX_SENT_RETENTION_DAYS and returns how many."""
+    retention = current_app.config['OUTBOX_SENT_RETENTION_DAYS']
+    if retention is None:
+        return 0
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=retention)
+    purged = 0
+    while True: # In chunks, so enqueuing requests never wait long on the write lock
+        expired = (db.select(NotificationOutbox.id)
+                   .where(NotificationOutbox.status == 'sent', NotificationOutbox.sent_at < cutoff)
+                   .limit(chunk_size))
+        deleted = db.session.execute(db.delete(NotificationOutbox).where(NotificationOutbox.id.in_(expired))).rowcount
+        db.session.commit()
+        purged += deleted
+        if deleted < chunk_size:
+            return purged
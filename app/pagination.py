@@ -0,0 +1,116 @@
+from flask import current_app, request
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+import collections
+import datetime
+import base64
+import json
+from .models import Attachment, Comment
+
+# --- Pagination Helpers ---
+# Dashboards use keyset (cursor) pagination: every page is fetched with a WHERE on the
+# sort key of the last row already shown, so a page costs the same no matter how deep it is.
+# Cursors are opaque url-safe strings carrying the sort-key values of a boundary row.
+
+def encode_cursor(values):
+    payload = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, columns):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, list) or len(payload) != len(columns):
+        return None
+    values = []
+    for column, value in zip(columns, payload):
+        try:
+            if column.type.python_type is datetime.datetime:
+                values.append(datetime.datetime.fromisoformat(value))
+            else:
+                values.append(column.type.python_type(value))
+        except (TypeError, ValueError):
+            return None # Tampered or stale cursor, fall back to the first page
+    return values
+
+def keyset_condition(columns, values, older=True):
+    # Lexicographic comparison on the sort key, e.g. for (updated_at, id):
+    # updated_at <= :u AND (updated_at < :u OR (updated_at = :u AND id < :id))
+    # The redundant leading bound lets the database seek into the index instead of walking it
+    clauses = []
+    for i, column in enumerate(columns):
+        bound = column < values[i] if older else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], bound))
+    leading = columns[0] <= values[0] if older else columns[0] >= values[0]
+    return and_(leading, or_(*clauses))
+
+def requested_page_size():
+    per_page = request.args.get('per_page', current_app.config['TICKETS_PER_PAGE'], type=int)
+    return max(1, min(per_page, current_app.config['MAX_TICKETS_PER_PAGE']))
+
+def keyset_page_query(query, columns, values=None, backwards=False, limit=None):
+    # The statement behind one page; also used by check-query-plans to EXPLAIN the real query shapes
+    if values is not None:
+        query = query.filter(keyset_condition(columns, values, older=not backwards))
+    if backwards:
+        query = query.order_by(*[column.asc() for column in columns])
+    else:
+        query = query.order_by(*[column.desc() for column in columns])
+    return query.limit(limit) if limit else query
+
+def paginate_keyset(query, columns, after=None, before=None, per_page=None):
+    """Returns (items, next_cursor, prev_cursor) for `query` ordered by `columns` descending.
+
+    `columns` must end with a unique column (normally the primary key) so the order is total.
+    """
+    per_page = per_page or current_app.config['TICKETS_PER_PAGE']
+    backwards = False
+    values = decode_cursor(after, columns) if after else None
+    if values is None and before:
+        values = decode_cursor(before, columns)
+        backwards = values is not None
+
+    # Fetch one extra row to learn whether another page exists in the direction of travel
+    rows = keyset_page_query(query, columns, values, backwards, limit=per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+
+    first_key = encode_cursor([getattr(rows[0], column.key) for column in columns])
+    last_key = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    if backwards:
+        return rows, last_key, first_key if has_more else None
+    return rows, last_key if has_more else None, first_key if values is not None else None
+
+# --- Comment Threads ---
+# A ticket page shows only the newest COMMENTS_PER_PAGE comments; older ones are fetched on demand
+# with the keyset cursor of the oldest comment shown. Authors are joined into the same statement and
+# attachments are loaded for the page's comments only, so a page costs the same few queries however long
+# the conversation is. Threads of archived tickets are read the same way from comment_archive.
+
+def comment_thread_columns(model=Comment):
+    return [model.created_at, model.id]
+
+def comment_thread_query(ticket_id, model=Comment):
+    return model.query.filter_by(ticket_id=ticket_id).options(joinedload(model.comment_author, innerjoin=True))
+
+def comment_thread_page(ticket_id, earlier=None, model=Comment):
+    """Returns (comments oldest first, cursor for the comments before them or None)."""
+    comments, earlier_cursor, _ = paginate_keyset(comment_thread_query(ticket_id, model), comment_thread_columns(model),
+                                                   after=earlier, per_page=current_app.config['COMMENTS_PER_PAGE'])
+    comments.reverse()
+    return comments, earlier_cursor
+
+def comment_attachments(ticket_id, comments, include_ticket=False):
+    # {comment_id: [attachments]}; the ticket's own attachments are filed under None
+    condition = Attachment.comment_id.in_([c.id for c in comments])
+    if include_ticket:
+        condition = or_(condition, Attachment.comment_id.is_(None))
+    grouped = collections.defaultdict(list)
+    for attachment in Attachment.query.filter(Attachment.ticket_id == ticket_id, condition).order_by(Attachment.id):
+        grouped[attachment.comment_id].append(attachment)
+    return grouped
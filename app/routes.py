@@ -1,26 +1,689 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, send_file, abort, Response, jsonify
+from flask import stream_with_context
 from flask_login import login_required, current_user
-from .models import User, ParkingLot, ParkingSpot, Reservation
-from . import db
-from datetime import datetime
-from sqlalchemy import func
-from functools import wraps
-from datetime import datetime, timezone, timedelta
+import time
+import datetime
+from .extensions import db, read_only
+from .models import ArchivedComment, ArchivedTicket, Attachment, Category, Comment, Ticket, TicketStat, User
+from .caches import bump_cache_version, category_registry, ticket_epoch, user_cache
+from .pagination import comment_attachments, comment_thread_page, paginate_keyset, requested_page_size
+from .notifications import enqueue_notification
+from .attachments import (
+    attachment_path, delete_comment_attachments, remove_unreferenced_blobs, store_uploaded_attachments)
+from .search import (
+    index_comment_for_search, index_ticket_for_search, remove_comment_from_search, search_documents)
+from .live import event_stream, live_broker, publish_event, ticket_topics, topic_allowed
+from .tickets import (
+    adjust_ticket_stats, bulk_update_tickets, least_loaded_agent_id, move_ticket_stats, record_first_response,
+    record_ticket_event, record_vote, stats_key_unchanged, ticket_stats_summary)
+from .transfer import EXPORT_COLUMNS, export_csv, export_ndjson
+from .archive import locate_ticket
+from .conditional import add_validators, make_etag, not_modified_response
 
+# --- Routes ---
 bp = Blueprint('main', __name__)
-IST = timezone(timedelta(hours=5, minutes=30))
-
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_admin:
-            flash('Admin access is required for this page.', 'danger')
-            return redirect(url_for('main.index'))
-        return f(*args, **kwargs)
-
-    return decorated_function
-@bp.route('/',methods=['GET',"POST"])
+
+@bp.after_app_request
+def stick_to_primary_after_write(response):
+    if current_app.config['DATABASE_REPLICA_URL'] and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+@bp.route('/')
 def index():
-    if request.method=='GET':
-        return render_template(index.html)
-    
\ No newline at end of file
+    if current_user.is_authenticated:
+        if current_user.role == 'admin':
+            return redirect(url_for('main.admin_dashboard'))
+        elif current_user.role == 'support_agent':
+            return redirect(url_for('main.agent_dashboard'))
+        elif current_user.role=='end_user':
+            return redirect(url_for('main.user_dashboard'))
+    return render_template('index.html')
+
+@bp.route('/dashboard/user')
+@login_required
+@read_only
+def user_dashboard():
+    if current_user.role not in ['end_user', 'admin']: # Admin can also see their tickets
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+
+    # Filtering and sorting logic
+    status_filter = request.args.get('status', 'all')
+    category_filter = request.args.get('category', 'all')
+    sort_by = request.args.get('sort_by', 'recently_modified') # most_replied, recently_modified
+    archived = request.args.get('archived') == '1' # Archived tickets are listed only when asked for
+    model = ArchivedTicket if archived else Ticket
+    per_page = requested_page_size()
+
+    # Watermark over all of the user's tickets rather than the filtered set, so a ticket that leaves
+    # the current filter (e.g. a status change) still changes the ETag
+    watermark = (db.session.query(db.func.max(model.updated_at))
+                 .filter(model.user_id == current_user.id).scalar())
+    etag = make_etag('user_dashboard', current_user.id, current_user.role, watermark, ticket_epoch.poll(),
+                     category_registry.version, request.query_string.decode('utf-8'))
+    not_modified = not_modified_response(etag, watermark)
+    if not_modified:
+        return not_modified
+
+    query = model.query.filter_by(user_id=current_user.id)
+
+    if status_filter != 'all' and not archived: # Every archived ticket is Closed
+        query = query.filter_by(status=status_filter)
+    if category_filter != 'all':
+        category = category_registry.get_by_name(category_filter)
+        if category:
+            query = query.filter_by(category_id=category.id)
+
+    if sort_by == 'most_replied':
+        sort_columns = [model.comment_count, model.id] # Denormalized count, no join against comments
+    else: # recently_modified
+        sort_columns = [model.updated_at, model.id]
+    tickets, next_cursor, prev_cursor = paginate_keyset(
+        query, sort_columns,
+        after=request.args.get('after'), before=request.args.get('before'), per_page=per_page)
+
+    categories = category_registry.all()
+    return add_validators(render_template('tickets/view_tickets.html', tickets=tickets, categories=categories,
+                                          selected_status=status_filter, selected_category=category_filter, selected_sort=sort_by,
+                                          next_cursor=next_cursor, prev_cursor=prev_cursor, per_page=per_page,
+                                          archived=archived),
+                          etag, watermark)
+
+@bp.route('/ticket/create', methods=['GET', 'POST'])
+@login_required
+def create_ticket():
+    if request.method == 'POST':
+        subject = request.form['subject']
+        description = request.form['description']
+        category_name = request.form['category']
+
+        category = category_registry.get_by_name(category_name)
+        if not category:
+            flash('Invalid category selected.', 'danger')
+            return redirect(url_for('main.create_ticket'))
+
+        ticket = Ticket(
+            user_id=current_user.id,
+            category_id=category.id,
+            subject=subject,
+            description=description,
+            status='Open'
+        )
+        if current_app.config['TICKET_AUTO_ASSIGN'] == 'least_loaded':
+            ticket.assigned_agent_id = least_loaded_agent_id()
+        db.session.add(ticket)
+        db.session.flush() # Assigns ticket.id for the attachments and notification below
+        store_uploaded_attachments(ticket.id)
+        index_ticket_for_search(ticket)
+        adjust_ticket_stats(ticket.category_id, ticket.assigned_agent_id, ticket.status, 1)
+        record_ticket_event(ticket, 'created', current_user.id, to_status=ticket.status, at=ticket.created_at)
+        publish_event('ticket_created', ticket_topics(ticket.id, ticket.user_id, [ticket.assigned_agent_id]),
+                      ticket_id=ticket.id, subject=subject, category=category.name, status=ticket.status)
+        enqueue_notification(ticket.id, 'ticket_created', current_app.config['SUPPORT_NOTIFICATION_EMAIL'],
+                             f'[QuickDesk #{ticket.id}] New ticket: {subject}',
+                             f'{current_user.username} opened ticket #{ticket.id} in {category.name}.\n\n{description}')
+        db.session.commit()
+
+        flash('Ticket created successfully!', 'success')
+        return redirect(url_for('main.user_dashboard'))
+
+    categories = category_registry.all()
+    return render_template('tickets/create_ticket.html', categories=categories)
+
+@bp.route('/ticket/<int:ticket_id>')
+@login_required
+@read_only
+def ticket_detail(ticket_id):
+    # Primary-key lookup of the two columns needed for the permission check and the ETag;
+    # add_comment, update_ticket_status, votes and assignment all bump updated_at. Archived tickets
+    # are found in ticket_archive and shown read-only.
+    model, ticket_state = locate_ticket(ticket_id)
+    if ticket_state is None:
+        abort(404)
+    archived = model is ArchivedTicket
+
+    # Ensure only owner, agent, or admin can view
+    if current_user.id != ticket_state.user_id and current_user.role not in ['support_agent', 'admin']:
+        flash('You do not have permission to view this ticket.', 'danger')
+        return redirect(url_for('main.index'))
+
+    # The table is part of the ETag: archiving keeps updated_at, but the archived page has no forms
+    etag = make_etag('ticket', model.__tablename__, ticket_id, ticket_state.updated_at, current_user.id,
+                     current_user.role)
+    not_modified = not_modified_response(etag, ticket_state.modified_at)
+    if not_modified:
+        return not_modified
+
+    ticket = model.query.get_or_404(ticket_id)
+    comments, earlier_cursor = comment_thread_page(ticket.id, model=ArchivedComment if archived else Comment)
+    attachments = comment_attachments(ticket.id, comments, include_ticket=True)
+    return add_validators(render_template('tickets/ticket_detail.html', ticket=ticket, comments=comments,
+                                          attachments=attachments.pop(None, []), comment_attachments=attachments,
+                                          earlier_cursor=earlier_cursor, archived=archived),
+                          etag, ticket_state.modified_at)
+
+@bp.route('/ticket/<int:ticket_id>/comments')
+@login_required
+@read_only
+def ticket_comments(ticket_id):
+    """'Load earlier' for ticket_detail: the page of comments before ?earlier=<cursor>, as JSON."""
+    model, ticket_state = locate_ticket(ticket_id)
+    if ticket_state is None:
+        abort(404)
+    if current_user.id != ticket_state.user_id and current_user.role not in ['support_agent', 'admin']:
+        abort(403)
+
+    etag = make_etag('ticket_comments', model.__tablename__, ticket_id, ticket_state.updated_at, current_user.id,
+                     current_user.role, request.query_string.decode('utf-8'))
+    not_modified = not_modified_response(etag, ticket_state.modified_at)
+    if not_modified:
+        return not_modified
+
+    comments, earlier_cursor = comment_thread_page(ticket_id, earlier=request.args.get('earlier'),
+                                                   model=ArchivedComment if model is ArchivedTicket else Comment)
+    attachments = comment_attachments(ticket_id, comments)
+    response = jsonify(earlier_cursor=earlier_cursor, comments=[{
+        'id': c.id, 'author': c.comment_author.username, 'text': c.comment_text,
+        'created_at': c.created_at.isoformat() if c.created_at else None,
+        'attachments': [{'id': a.id, 'filename': a.filename, 'size': a.size,
+                         'url': url_for('main.download_attachment', attachment_id=a.id)}
+                        for a in attachments[c.id]],
+    } for c in comments])
+    return add_validators(response, etag, ticket_state.modified_at)
+
+@bp.route('/attachment/<int:attachment_id>')
+@login_required
+def download_attachment(attachment_id):
+    attachment = Attachment.query.get_or_404(attachment_id)
+    _, ticket_state = locate_ticket(attachment.ticket_id) # Attachments of archived tickets stay downloadable
+    if ticket_state is None:
+        abort(404)
+
+    # Same visibility rule as ticket_detail
+    if current_user.id != ticket_state.user_id and current_user.role not in ['support_agent', 'admin']:
+        abort(403)
+
+    # conditional=True answers If-None-Match/If-Modified-Since with 304 and Range with 206
+    return send_file(attachment_path(attachment.sha256), mimetype=attachment.content_type,
+                     as_attachment=True, download_name=attachment.filename,
+                     conditional=True, etag=attachment.sha256)
+
+@bp.route('/ticket/<int:ticket_id>/comment', methods=['POST'])
+@login_required
+def add_comment(ticket_id):
+    ticket = Ticket.query.get_or_404(ticket_id)
+    comment_text = request.form['comment_text']
+
+    # Allow owner, agent, or admin to comment
+    if current_user.id != ticket.user_id and current_user.role not in ['support_agent', 'admin']:
+        flash('You do not have permission to comment on this ticket.', 'danger')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+    if not comment_text:
+        flash('Comment cannot be empty.', 'danger')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+    comment = Comment(
+        ticket_id=ticket.id,
+        user_id=current_user.id,
+        comment_text=comment_text
+    )
+    db.session.add(comment)
+    db.session.flush() # Assigns comment.id for its attachments
+    store_uploaded_attachments(ticket.id, comment.id)
+    index_comment_for_search(comment, ticket)
+    record_first_response(ticket, current_user.id, comment.created_at)
+    publish_event('comment', ticket_topics(ticket.id, ticket.user_id, [ticket.assigned_agent_id]),
+                  ticket_id=ticket.id, comment_id=comment.id, author=current_user.username,
+                  created_at=comment.created_at)
+    # Update ticket's updated_at to reflect new activity
+    ticket.updated_at = datetime.datetime.now()
+    ticket.comment_count = Ticket.comment_count + 1 # Incremented in SQL so concurrent comments don't lose updates
+    db.session.commit()
+
+    flash('Comment added successfully!', 'success')
+    return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+@bp.route('/comment/<int:comment_id>/delete', methods=['POST'])
+@login_required
+def delete_comment(comment_id):
+    comment = Comment.query.get_or_404(comment_id)
+    ticket = comment.ticket
+
+    # Only the comment's author or an admin can remove it
+    if current_user.id != comment.user_id and current_user.role != 'admin':
+        flash('You do not have permission to delete this comment.', 'danger')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+    remove_comment_from_search(comment.id)
+    orphaned_blobs = delete_comment_attachments(comment.id)
+    db.session.delete(comment)
+    ticket.updated_at = datetime.datetime.now()
+    ticket.comment_count = Ticket.comment_count - 1
+    db.session.commit()
+    remove_unreferenced_blobs(orphaned_blobs)
+
+    flash('Comment deleted.', 'info')
+    return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+@bp.route('/search')
+@login_required
+def search_tickets():
+    query_text = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    # End users only ever see hits from their own tickets
+    owner_id = current_user.id if current_user.role == 'end_user' else None
+    hits, has_next = search_documents(query_text, owner_id=owner_id, page=page)
+    return jsonify(query=query_text, page=page, has_next=has_next, hits=[{
+        'ticket_id': hit['ticket'].id, 'subject': hit['ticket'].subject, 'status': hit['ticket'].status,
+        'comment_id': hit['comment_id'], 'snippet': str(hit['snippet']), 'score': hit['score'],
+        'url': url_for('main.ticket_detail', ticket_id=hit['ticket'].id),
+    } for hit in hits])
+
+@bp.route('/events')
+@login_required
+def live_events():
+    topics = request.args.getlist('topic')
+    if not topics:
+        topics = ['queue:all'] if current_user.role in ['support_agent', 'admin'] else [f'queue:user:{current_user.id}']
+    if not all(topic_allowed(topic) for topic in topics):
+        abort(403)
+
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = live_broker.subscribe(topics, last_event_id)
+    return Response(event_stream(subscription, current_app.config['LIVE_HEARTBEAT']), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/ticket/<int:ticket_id>/vote/<string:vote_type>', methods=['POST'])
+@login_required
+def vote_ticket(ticket_id, vote_type):
+    ticket = Ticket.query.get_or_404(ticket_id)
+
+    # Only end users can upvote/downvote
+    if current_user.role != 'end_user':
+        flash('Only end users can vote on tickets.', 'danger')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+    if vote_type not in ['upvote', 'downvote']:
+        flash('Invalid vote type.', 'danger')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+    outcome = record_vote(current_user.id, ticket.id, 1 if vote_type == 'upvote' else -1)
+    db.session.commit()
+    if outcome == 'new':
+        flash('Ticket upvoted!' if vote_type == 'upvote' else 'Ticket downvoted!',
+              'success' if vote_type == 'upvote' else 'info')
+    elif outcome == 'changed':
+        flash(f'Your vote was changed to {vote_type}.', 'info')
+    else:
+        flash(f'You have already {vote_type}d this ticket.', 'info')
+    return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+# --- Support Agent Routes ---
+def filter_agent_tickets(query, status_filter, category_filter, assigned_filter, model=Ticket):
+    # The agent dashboard filters; also used to select the targets of a bulk operation
+    if status_filter != 'all' and model is Ticket: # Every archived ticket is Closed
+        query = query.filter_by(status=status_filter)
+    if category_filter != 'all':
+        category = category_registry.get_by_name(category_filter)
+        if category:
+            query = query.filter_by(category_id=category.id)
+    if assigned_filter == 'mine':
+        query = query.filter(model.assigned_agent_id == current_user.id)
+    elif assigned_filter == 'unassigned':
+        query = query.filter(model.assigned_agent_id.is_(None))
+    return query
+
+@bp.route('/dashboard/agent')
+@login_required
+@read_only
+def agent_dashboard():
+    if current_user.role != 'support_agent' and current_user.role != 'admin':
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+
+    status_filter = request.args.get('status', 'all')
+    category_filter = request.args.get('category', 'all')
+    assigned_filter = request.args.get('assigned', 'all') # 'all', 'mine', 'unassigned'
+    archived = request.args.get('archived') == '1' # Archived tickets are listed only when asked for
+    model = ArchivedTicket if archived else Ticket
+    per_page = requested_page_size()
+
+    # Any ticket change can move a ticket into or out of an agent view, so the watermark is global
+    # (a single probe of ix_ticket_updated); the users stamp covers the agent list
+    watermark = db.session.query(db.func.max(model.updated_at)).scalar()
+    etag = make_etag('agent_dashboard', current_user.id, current_user.role, watermark, ticket_epoch.poll(),
+                     category_registry.version, user_cache.version, request.query_string.decode('utf-8'))
+    not_modified = not_modified_response(etag, watermark)
+    if not_modified:
+        return not_modified
+
+    query = filter_agent_tickets(model.query, status_filter, category_filter, assigned_filter, model)
+    tickets, next_cursor, prev_cursor = paginate_keyset(
+        query, [model.updated_at, model.id],
+        after=request.args.get('after'), before=request.args.get('before'), per_page=per_page)
+    categories = category_registry.all()
+    agents = User.query.filter_by(role='support_agent').all() # Choices for the assign/reassign form
+
+    return add_validators(render_template('agent/agent_dashboard.html', tickets=tickets, categories=categories, agents=agents,
+                                          selected_status=status_filter, selected_category=category_filter,
+                                          selected_assigned=assigned_filter,
+                                          next_cursor=next_cursor, prev_cursor=prev_cursor, per_page=per_page,
+                                          archived=archived),
+                          etag, watermark)
+
+@bp.route('/ticket/<int:ticket_id>/update_status', methods=['POST'])
+@login_required
+def update_ticket_status(ticket_id):
+    if current_user.role not in ['support_agent', 'admin']:
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+
+    ticket = Ticket.query.get_or_404(ticket_id)
+    new_status = request.form['new_status']
+
+    valid_statuses = ['Open', 'In Progress', 'Resolved', 'Closed']
+    if new_status not in valid_statuses:
+        flash('Invalid status.', 'danger')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+    if new_status == ticket.status:
+        flash(f'Ticket is already {new_status}.', 'info')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+    # Conditional on the status and assignee we read, so a concurrent change cannot leave the counters
+    # keyed by a stale value
+    old_status = ticket.status
+    now = datetime.datetime.now()
+    changed = db.session.execute(
+        db.update(Ticket)
+        .where(Ticket.id == ticket.id, *stats_key_unchanged(ticket))
+        .values(status=new_status, updated_at=now)) # Manually update for status changes
+    if not changed.rowcount:
+        db.session.rollback()
+        flash('This ticket was changed by someone else. Please review it and try again.', 'warning')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+    move_ticket_stats((ticket.category_id, ticket.assigned_agent_id, old_status),
+                      (ticket.category_id, ticket.assigned_agent_id, new_status))
+    record_ticket_event(ticket, 'status', current_user.id, from_status=old_status, to_status=new_status, at=now)
+    publish_event('status', ticket_topics(ticket.id, ticket.user_id, [ticket.assigned_agent_id]),
+                  ticket_id=ticket.id, status=new_status)
+    enqueue_notification(ticket.id, 'status_changed', ticket.author.email,
+                         f'[QuickDesk #{ticket.id}] Status changed to {new_status}',
+                         f'Your ticket "{ticket.subject}" is now {new_status}.')
+    db.session.commit()
+    flash(f'Ticket status updated to {new_status}!', 'success')
+    return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+@bp.route('/ticket/<int:ticket_id>/claim', methods=['POST'])
+@login_required
+def claim_ticket(ticket_id):
+    if current_user.role != 'support_agent':
+        flash('Only support agents can claim tickets.', 'danger')
+        return redirect(url_for('main.index'))
+
+    ticket = Ticket.query.get_or_404(ticket_id)
+    if ticket.assigned_agent_id is not None:
+        flash('This ticket is already assigned.', 'warning')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+    # Conditional UPDATE so two agents claiming the same ticket at once cannot both win
+    result = db.session.execute(
+        db.update(Ticket)
+        .where(Ticket.id == ticket.id, *stats_key_unchanged(ticket))
+        .values(assigned_agent_id=current_user.id, updated_at=datetime.datetime.now()))
+    if result.rowcount:
+        move_ticket_stats((ticket.category_id, None, ticket.status), (ticket.category_id, current_user.id, ticket.status))
+        publish_event('assignment', ticket_topics(ticket.id, ticket.user_id, [current_user.id, None]),
+                      ticket_id=ticket.id, agent_id=current_user.id)
+    db.session.commit()
+    if result.rowcount:
+        flash(f'Ticket #{ticket.id} assigned to you.', 'success')
+    else:
+        flash('This ticket is already assigned.', 'warning')
+    return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+@bp.route('/ticket/<int:ticket_id>/assign', methods=['POST'])
+@login_required
+def assign_ticket(ticket_id):
+    # Assigns, reassigns or (with an empty agent_id) unassigns a ticket
+    if current_user.role not in ['support_agent', 'admin']:
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+
+    ticket = Ticket.query.get_or_404(ticket_id)
+    agent_id = request.form.get('agent_id', type=int)
+    if agent_id is not None:
+        agent = User.query.get(agent_id)
+        if not agent or agent.role != 'support_agent':
+            flash('Invalid agent selected.', 'danger')
+            return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+    old_agent_id = ticket.assigned_agent_id
+    if agent_id == old_agent_id:
+        flash('The ticket already has this assignee.', 'info')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+    # Conditional UPDATE, like claim_ticket: the counters and subscribers only hear about the change
+    # if the ticket still had the assignee (and status) we read
+    changed = db.session.execute(
+        db.update(Ticket)
+        .where(Ticket.id == ticket.id, *stats_key_unchanged(ticket))
+        .values(assigned_agent_id=agent_id, updated_at=datetime.datetime.now()))
+    if not changed.rowcount:
+        db.session.rollback()
+        flash('This ticket was changed by someone else. Please review it and try again.', 'warning')
+        return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+    move_ticket_stats((ticket.category_id, old_agent_id, ticket.status),
+                      (ticket.category_id, agent_id, ticket.status))
+    publish_event('assignment', ticket_topics(ticket.id, ticket.user_id, [agent_id, old_agent_id]),
+                  ticket_id=ticket.id, agent_id=agent_id)
+    db.session.commit()
+    if agent_id is None:
+        flash(f'Ticket #{ticket.id} is now unassigned.', 'info')
+    else:
+        flash(f'Ticket #{ticket.id} assigned to {agent.username}.', 'success')
+    return redirect(url_for('main.ticket_detail', ticket_id=ticket.id))
+
+@bp.route('/tickets/bulk', methods=['POST'])
+@login_required
+def bulk_tickets():
+    # Applies one change to the checked tickets (ticket_ids) or, with select=filter, to every ticket
+    # matching the agent dashboard filters. Answers JSON when asked for it, otherwise flashes a summary.
+    if current_user.role not in ['support_agent', 'admin']:
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    wants_json = request.accept_mimetypes.best == 'application/json'
+
+    def refuse(message):
+        if wants_json:
+            return jsonify(error=message), 400
+        flash(message, 'danger')
+        return redirect(url_for('main.agent_dashboard'))
+
+    action = request.form.get('action')
+    if action == 'status':
+        value = request.form.get('new_status')
+        if value not in ['Open', 'In Progress', 'Resolved', 'Closed']:
+            return refuse('Invalid status.')
+    elif action == 'category':
+        category = category_registry.get(request.form.get('category_id', type=int))
+        if not category:
+            return refuse('Invalid category selected.')
+        value = category.id
+    elif action == 'assign':
+        value = request.form.get('agent_id', type=int) # Empty unassigns
+        if value is not None:
+            agent = User.query.get(value)
+            if not agent or agent.role != 'support_agent':
+                return refuse('Invalid agent selected.')
+    else:
+        return refuse('Unknown bulk action.')
+
+    limit = current_app.config['BULK_TICKET_LIMIT']
+    if request.form.get('select') == 'filter':
+        status_filter = request.form.get('status', 'all')
+        category_filter = request.form.get('category', 'all')
+        assigned_filter = request.form.get('assigned', 'all')
+        # filter_agent_tickets ignores a filter it does not recognise, which here would widen the change
+        if status_filter not in ['all', 'Open', 'In Progress', 'Resolved', 'Closed']:
+            return refuse('Invalid status filter.')
+        if category_filter != 'all' and not category_registry.get_by_name(category_filter):
+            return refuse('Invalid category filter.')
+        if assigned_filter not in ['all', 'mine', 'unassigned']:
+            return refuse('Invalid assignment filter.')
+        query = filter_agent_tickets(Ticket.query, status_filter, category_filter, assigned_filter)
+        ticket_ids = [ticket_id for (ticket_id,) in query.with_entities(Ticket.id).order_by(Ticket.id).limit(limit + 1)]
+    else:
+        ticket_ids = list(dict.fromkeys(request.form.getlist('ticket_ids', type=int)))
+    if not ticket_ids:
+        return refuse('No tickets selected.')
+    if len(ticket_ids) > limit:
+        return refuse(f'A bulk change is limited to {limit} tickets; narrow the selection.')
+
+    summary = bulk_update_tickets(ticket_ids, action, value, current_user.id)
+    db.session.commit()
+    if wants_json:
+        return jsonify(summary)
+    message = f"Updated {summary['updated']} of {summary['requested']} tickets."
+    skipped = summary['unchanged'] + summary['conflicts'] + summary['requested'] - summary['found']
+    if skipped:
+        message += f' {skipped} already matched, were changed by someone else, or no longer exist.'
+    flash(message, 'success' if summary['updated'] else 'info')
+    return redirect(url_for('main.agent_dashboard'))
+
+# --- Admin Routes ---
+@bp.route('/dashboard/admin')
+@login_required
+def admin_dashboard():
+    if current_user.role != 'admin':
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    users, next_cursor, prev_cursor = paginate_keyset(
+        User.query, [User.id],
+        after=request.args.get('after'), before=request.args.get('before'), per_page=requested_page_size())
+    categories = category_registry.all()
+    return render_template('admin/admin_dashboard.html', users=users, categories=categories,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor,
+                           ticket_stats=ticket_stats_summary(), user_cache_stats=user_cache.stats())
+
+@bp.route('/reports/sla')
+@login_required
+@read_only
+def sla_report_view():
+    if current_user.role not in ['support_agent', 'admin']:
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    scope = request.args.get('scope', 'all')
+    if scope not in ('all', 'category', 'agent'):
+        abort(400)
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    from .analytics import SLA_METRICS, sla_report # Imported on first use; see app/analytics.py
+    until = datetime.datetime.now()
+    report = sla_report(until - datetime.timedelta(days=days), until, scope)
+    report.update(since=report['since'].isoformat(), until=report['until'].isoformat())
+    for metric in SLA_METRICS:
+        for point in report[metric]['series']:
+            point['bucket_start'] = point['bucket_start'].isoformat()
+    return jsonify(days=days, **report)
+
+@bp.route('/admin/export/<entity>.<fmt>')
+@login_required
+def export_data(entity, fmt):
+    # /admin/export/all.ndjson, /admin/export/tickets.csv, ... streamed without buffering the table.
+    # Password hashes are only ever exported through the CLI.
+    if current_user.role != 'admin':
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    if fmt == 'ndjson' and (entity == 'all' or entity in EXPORT_COLUMNS):
+        body = export_ndjson(list(EXPORT_COLUMNS) if entity == 'all' else [entity])
+        mimetype = 'application/x-ndjson'
+    elif fmt == 'csv' and entity in EXPORT_COLUMNS:
+        body, mimetype = export_csv(entity), 'text/csv'
+    else:
+        abort(404)
+    filename = f"quickdesk-{entity}-{datetime.date.today().isoformat()}.{fmt}"
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@bp.route('/admin/users')
+@login_required
+def manage_users():
+    if current_user.role != 'admin':
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    users, next_cursor, prev_cursor = paginate_keyset(
+        User.query, [User.id],
+        after=request.args.get('after'), before=request.args.get('before'), per_page=requested_page_size())
+    return render_template('admin/user_management.html', users=users,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+@bp.route('/admin/user/<int:user_id>/update_role', methods=['POST'])
+@login_required
+def update_user_role(user_id):
+    if current_user.role != 'admin':
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    user = User.query.get_or_404(user_id)
+    new_role = request.form['new_role']
+    valid_roles = ['end_user', 'support_agent', 'admin']
+    if new_role not in valid_roles:
+        flash('Invalid role.', 'danger')
+        return redirect(url_for('main.manage_users'))
+    user.role = new_role
+    bump_cache_version('users') # Other workers drop their cached copy, so the new role applies everywhere
+    db.session.commit()
+    user_cache.invalidate(user.id)
+    flash(f'User {user.username} role updated to {new_role}.', 'success')
+    return redirect(url_for('main.manage_users'))
+
+@bp.route('/admin/categories')
+@login_required
+def manage_categories():
+    if current_user.role != 'admin':
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    categories = category_registry.all()
+    return render_template('admin/category_management.html', categories=categories)
+
+@bp.route('/admin/category/add', methods=['POST'])
+@login_required
+def add_category():
+    if current_user.role != 'admin':
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    category_name = request.form['category_name']
+    if not category_name:
+        flash('Category name cannot be empty.', 'danger')
+        return redirect(url_for('main.manage_categories'))
+    existing_category = Category.query.filter_by(name=category_name).first()
+    if existing_category:
+        flash('Category already exists.', 'danger')
+        return redirect(url_for('main.manage_categories'))
+    new_category = Category(name=category_name)
+    db.session.add(new_category)
+    bump_cache_version('categories')
+    db.session.commit()
+    category_registry.invalidate()
+    flash(f'Category "{category_name}" added.', 'success')
+    return redirect(url_for('main.manage_categories'))
+
+@bp.route('/admin/category/<int:category_id>/delete', methods=['POST'])
+@login_required
+def delete_category(category_id):
+    if current_user.role != 'admin':
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('main.index'))
+    category = Category.query.get_or_404(category_id)
+    # Check if there are tickets linked to this category before deleting (an index probe, not a load of every ticket);
+    # archived tickets still show their category
+    if (db.session.query(Ticket.id).filter_by(category_id=category.id).first()
+            or db.session.query(ArchivedTicket.id).filter_by(category_id=category.id).first()):
+        flash('Cannot delete category with associated tickets.', 'danger')
+        return redirect(url_for('main.manage_categories'))
+    db.session.execute(db.delete(TicketStat).where(TicketStat.scope == 'category', TicketStat.scope_id == category.id))
+    db.session.delete(category)
+    bump_cache_version('categories')
+    db.session.commit()
+    category_registry.invalidate()
+    flash(f'Category "{category.name}" deleted.', 'success')
+    return redirect(url_for('main.manage_categories'))
@@ -0,0 +1,91 @@
+from flask import current_app
+from markupsafe import Markup, escape
+import re
+from .extensions import db
+from .models import ArchivedTicket, Ticket
+
+# --- Full-Text Search ---
+# search_index is an SQLite FTS5 table holding one document per ticket (subject + description)
+# and one per comment. Rows use fixed rowids (ticket id * 2, comment id * 2 + 1) so create_ticket,
+# add_comment and delete_comment can update single documents inside their own transaction.
+SNIPPET_START, SNIPPET_END = '\x02', '\x03' # Placeholders swapped for <mark> after HTML-escaping
+
+def search_enabled():
+    return db.session.get_bind().dialect.name == 'sqlite'
+
+SEARCH_INSERT_TICKET = db.text(
+    'INSERT INTO search_index (rowid, title, body, ticket_id, comment_id, owner_id) '
+    'VALUES (:rowid, :title, :body, :ticket_id, NULL, :owner_id)')
+SEARCH_INSERT_COMMENT = db.text(
+    'INSERT INTO search_index (rowid, title, body, ticket_id, comment_id, owner_id) '
+    "VALUES (:rowid, '', :body, :ticket_id, :comment_id, :owner_id)")
+
+def index_ticket_for_search(ticket):
+    if not search_enabled():
+        return
+    db.session.execute(db.text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': ticket.id * 2})
+    db.session.execute(SEARCH_INSERT_TICKET, {'rowid': ticket.id * 2, 'title': ticket.subject, 'body': ticket.description,
+                                              'ticket_id': ticket.id, 'owner_id': ticket.user_id})
+
+def index_comment_for_search(comment, ticket):
+    if not search_enabled():
+        return
+    db.session.execute(db.text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': comment.id * 2 + 1})
+    db.session.execute(SEARCH_INSERT_COMMENT, {'rowid': comment.id * 2 + 1, 'body': comment.comment_text,
+                                               'ticket_id': ticket.id, 'comment_id': comment.id,
+                                               'owner_id': ticket.user_id})
+
+def remove_comment_from_search(comment_id):
+    if search_enabled():
+        db.session.execute(db.text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': comment_id * 2 + 1})
+
+def rebuild_search_index(conn):
+    conn.execute(db.text('DELETE FROM search_index'))
+    # Archived tickets keep their documents, so old resolutions stay searchable
+    for ticket_table, comment_table in [('ticket', 'comment'), ('ticket_archive', 'comment_archive')]:
+        if not db.inspect(conn).has_table(ticket_table):
+            continue # Migration 9 builds the index before the archive tables exist
+        conn.execute(db.text(
+            'INSERT INTO search_index (rowid, title, body, ticket_id, comment_id, owner_id) '
+            f'SELECT id * 2, subject, description, id, NULL, user_id FROM {ticket_table}'))
+        conn.execute(db.text(
+            'INSERT INTO search_index (rowid, title, body, ticket_id, comment_id, owner_id) '
+            f"SELECT c.id * 2 + 1, '', c.comment_text, c.ticket_id, c.id, t.user_id "
+            f'FROM {comment_table} c JOIN {ticket_table} t ON t.id = c.ticket_id'))
+    conn.execute(db.text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+
+def fts_query(text):
+    # Quote every term so user input can never be parsed as FTS5 syntax; the last term is a prefix match
+    terms = re.findall(r'\w+', text)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def highlight_snippet(raw):
+    return Markup(str(escape(raw)).replace(SNIPPET_START, Markup('<mark>')).replace(SNIPPET_END, Markup('</mark>')))
+
+def search_documents(text, owner_id=None, page=1, per_page=None):
+    """Returns (hits, has_next); each hit is a dict with ticket, comment_id, snippet and score."""
+    per_page = per_page or current_app.config['SEARCH_RESULTS_PER_PAGE']
+    match = fts_query(text)
+    if match is None or not search_enabled():
+        return [], False
+    owner_clause = 'AND owner_id = :owner_id ' if owner_id is not None else ''
+    rows = db.session.execute(db.text(
+        'SELECT ticket_id, comment_id, bm25(search_index, 10.0, 1.0) AS score, '
+        f"snippet(search_index, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', 16) AS excerpt "
+        f'FROM search_index WHERE search_index MATCH :match {owner_clause}'
+        'ORDER BY score LIMIT :limit OFFSET :offset'),
+        {'match': match, 'owner_id': owner_id, 'limit': per_page + 1, 'offset': (page - 1) * per_page}).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    ticket_ids = {row.ticket_id for row in rows}
+    tickets = {t.id: t for t in Ticket.query.filter(Ticket.id.in_(ticket_ids))}
+    if len(tickets) < len(ticket_ids):
+        tickets.update((t.id, t) for t in ArchivedTicket.query.filter(ArchivedTicket.id.in_(ticket_ids - set(tickets))))
+    hits = [{'ticket': tickets[row.ticket_id], 'comment_id': row.comment_id,
+             'snippet': highlight_snippet(row.excerpt), 'score': row.score}
+            for row in rows if row.ticket_id in tickets]
+    return hits, has_next
@@ -0,0 +1,227 @@
+from sqlalchemy import and_
+import collections
+import uuid
+import datetime
+from .extensions import db, dialect_insert, insert_ignoring_conflicts
+from .models import ArchivedTicket, LiveEvent, Ticket, TicketEvent, TicketStat, TicketVote, User
+from .notifications import enqueue_notification
+from .live import live_event_pruner, live_event_values, ticket_topics
+
+# --- Assignment Helpers ---
+OPEN_STATUSES = ['Open', 'In Progress'] # Statuses that count towards an agent's workload
+
+def least_loaded_agent_id():
+    # Agent with the fewest open assigned tickets; ties go to the lowest id so routing is deterministic
+    open_count = db.func.count(Ticket.id)
+    row = (db.session.query(User.id)
+           .outerjoin(Ticket, and_(Ticket.assigned_agent_id == User.id, Ticket.status.in_(OPEN_STATUSES)))
+           .filter(User.role == 'support_agent')
+           .group_by(User.id)
+           .order_by(open_count.asc(), User.id.asc())
+           .first())
+    return row[0] if row else None
+
+# --- Ticket Statistics ---
+# ticket_stat holds per-status counts overall, per category and per assigned agent. Every route that
+# creates a ticket or changes its status, category or assignee calls adjust_ticket_stats in the same
+# transaction, so the admin dashboard reads a few dozen rows instead of GROUP BY over all tickets.
+# `flask --app app reconcile-ticket-stats` recomputes the counts and reports any drift.
+
+def stat_keys(category_id, agent_id, status):
+    return [('all', 0, status), ('category', category_id, status), ('agent', agent_id or 0, status)]
+
+def adjust_ticket_stats(category_id, agent_id, status, delta):
+    for scope, scope_id, stat_status in stat_keys(category_id, agent_id, status):
+        insert = dialect_insert(TicketStat).values(scope=scope, scope_id=scope_id, status=stat_status, count=delta)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['scope', 'scope_id', 'status'],
+            set_={'count': TicketStat.count + insert.excluded.count}))
+
+def move_ticket_stats(before, after):
+    # before/after are (category_id, agent_id, status) of the same ticket
+    if before != after:
+        adjust_ticket_stats(*before, -1)
+        adjust_ticket_stats(*after, 1)
+
+def stats_key_unchanged(ticket):
+    # WHERE conditions for an UPDATE that moves the counters from the key read earlier: if another
+    # request changed the category, assignee or status in between, the UPDATE matches no row
+    agent = Ticket.assigned_agent_id
+    return [Ticket.category_id == ticket.category_id, Ticket.status == ticket.status,
+            agent.is_(None) if ticket.assigned_agent_id is None else agent == ticket.assigned_agent_id]
+
+def expected_ticket_stats(conn):
+    # Archived tickets still count; archival moves rows without changing any ticket_stat key
+    expected = collections.Counter()
+    models = [Ticket, ArchivedTicket] if db.inspect(conn).has_table(ArchivedTicket.__tablename__) else [Ticket]
+    for model in models:
+        rows = conn.execute(db.select(model.category_id, model.assigned_agent_id, model.status, db.func.count(model.id))
+                            .group_by(model.category_id, model.assigned_agent_id, model.status))
+        for category_id, agent_id, status, count in rows:
+            for key in stat_keys(category_id, agent_id, status):
+                expected[key] += count
+    return expected
+
+def ticket_stats_summary():
+    summary = {'by_status': collections.Counter(), 'by_category': collections.defaultdict(collections.Counter),
+               'by_agent': collections.defaultdict(collections.Counter)}
+    for stat in TicketStat.query.filter(TicketStat.count != 0):
+        if stat.scope == 'all':
+            summary['by_status'][stat.status] = stat.count
+        else:
+            summary[f'by_{stat.scope}'][stat.scope_id][stat.status] = stat.count
+    summary['open_backlog'] = sum(summary['by_status'][status] for status in OPEN_STATUSES)
+    return summary
+
+# --- Ticket Event Log ---
+# update_ticket_status and add_comment append to ticket_event in the same transaction as the change;
+# app/analytics.py rolls the log up into the SLA reports.
+
+RESOLVED_STATUSES = ['Resolved', 'Closed']
+
+def record_ticket_event(ticket, kind, actor_id, from_status=None, to_status=None, at=None):
+    at = at or datetime.datetime.now()
+    db.session.add(TicketEvent(ticket_id=ticket.id, kind=kind, from_status=from_status, to_status=to_status,
+                               category_id=ticket.category_id, agent_id=ticket.assigned_agent_id,
+                               actor_id=actor_id, elapsed_seconds=(at - ticket.created_at).total_seconds(),
+                               occurred_at=at))
+
+def record_first_response(ticket, actor_id, at):
+    # Only the first reply from someone other than the author counts; the conditional UPDATE
+    # makes sure two agents answering at once record a single first response
+    if actor_id == ticket.user_id:
+        return
+    claimed = db.session.execute(db.update(Ticket)
+                                 .where(Ticket.id == ticket.id, Ticket.first_response_at.is_(None))
+                                 .values(first_response_at=at))
+    if claimed.rowcount:
+        record_ticket_event(ticket, 'first_response', actor_id, at=at)
+
+def ticket_event_seed_rows(tickets):
+    # Reconstructs the event log of tickets that were not created through the app (migrated or
+    # imported): creation, the first response, and the last update of resolved tickets
+    events = []
+    for ticket in tickets:
+        common = {'ticket_id': ticket.id, 'category_id': ticket.category_id, 'agent_id': ticket.assigned_agent_id}
+        events.append({**common, 'kind': 'created', 'from_status': None, 'to_status': 'Open',
+                       'elapsed_seconds': 0.0, 'occurred_at': ticket.created_at})
+        if ticket.first_response_at:
+            events.append({**common, 'kind': 'first_response', 'from_status': None, 'to_status': None,
+                           'elapsed_seconds': (ticket.first_response_at - ticket.created_at).total_seconds(),
+                           'occurred_at': ticket.first_response_at})
+        if ticket.status in RESOLVED_STATUSES and ticket.updated_at:
+            events.append({**common, 'kind': 'status', 'from_status': 'Open', 'to_status': ticket.status,
+                           'elapsed_seconds': (ticket.updated_at - ticket.created_at).total_seconds(),
+                           'occurred_at': ticket.updated_at})
+    events.sort(key=lambda e: e['occurred_at'])
+    return events
+
+# --- Bulk Ticket Operations ---
+# Status changes, category moves and assignment for many tickets at once. Targets are grouped by
+# the value being replaced and every group is changed by one conditional UPDATE ... RETURNING, so a
+# ticket someone else changed in the meantime is skipped instead of double-counted. Statistics,
+# the event log, the live feed and notifications are then written in bulk for the returned ids.
+
+# action -> (ticket column, live event kind, live event payload key), matching the single-ticket routes
+BULK_ACTIONS = {'status': ('status', 'status', 'status'),
+                'category': ('category_id', 'category', 'category_id'),
+                'assign': ('assigned_agent_id', 'assignment', 'agent_id')}
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def bulk_update_tickets(ticket_ids, action, value, actor_id):
+    """Sets one field on many tickets. Returns a summary of what happened to the requested ids."""
+    field, event_kind, payload_key = BULK_ACTIONS[action]
+    rows = db.session.execute(
+        db.select(Ticket.id, Ticket.user_id, Ticket.category_id, Ticket.assigned_agent_id, Ticket.status,
+                  Ticket.subject, Ticket.created_at, User.email.label('author_email'))
+        .join(User, User.id == Ticket.user_id)
+        .where(Ticket.id.in_(ticket_ids))).all()
+    targets = [row for row in rows if getattr(row, field) != value]
+    groups = collections.defaultdict(list) # By the stats key read above, which the UPDATE requires unchanged
+    for row in targets:
+        groups[(row.category_id, row.assigned_agent_id, row.status)].append(row)
+
+    now = datetime.datetime.now()
+    updated = []
+    for group in groups.values():
+        for chunk in chunked(group, 500):
+            changed = set(db.session.execute(
+                db.update(Ticket)
+                .where(Ticket.id.in_([row.id for row in chunk]), *stats_key_unchanged(chunk[0]))
+                .values({field: value, 'updated_at': now})
+                .returning(Ticket.id)).scalars())
+            updated.extend(row for row in chunk if row.id in changed)
+
+    stat_deltas = collections.Counter()
+    for row in updated:
+        before = {'category_id': row.category_id, 'assigned_agent_id': row.assigned_agent_id, 'status': row.status}
+        after = {**before, field: value}
+        stat_deltas[(before['category_id'], before['assigned_agent_id'], before['status'])] -= 1
+        stat_deltas[(after['category_id'], after['assigned_agent_id'], after['status'])] += 1
+    for key, delta in stat_deltas.items():
+        if delta:
+            adjust_ticket_stats(*key, delta)
+
+    if updated:
+        new_agent = value if action == 'assign' else None
+        db.session.execute(db.insert(LiveEvent), [
+            live_event_values(event_kind,
+                              ticket_topics(row.id, row.user_id,
+                                            [row.assigned_agent_id] + ([new_agent] if action == 'assign' else [])),
+                              ticket_id=row.id, **{payload_key: value})
+            for row in updated])
+        live_event_pruner.maybe_prune()
+    if updated and action == 'status':
+        db.session.execute(db.insert(TicketEvent), [
+            {'ticket_id': row.id, 'kind': 'status', 'from_status': row.status, 'to_status': value,
+             'category_id': row.category_id, 'agent_id': row.assigned_agent_id, 'actor_id': actor_id,
+             'elapsed_seconds': (now - row.created_at).total_seconds(), 'occurred_at': now}
+            for row in updated])
+        # One email per ticket owner, listing every ticket of theirs that changed
+        by_author = collections.defaultdict(list)
+        for row in updated:
+            by_author[row.author_email].append(row)
+        batch = uuid.uuid4().hex[:12]
+        for email, owned in by_author.items():
+            if len(owned) == 1:
+                row = owned[0]
+                enqueue_notification(row.id, 'status_changed', email,
+                                     f'[QuickDesk #{row.id}] Status changed to {value}',
+                                     f'Your ticket "{row.subject}" is now {value}.')
+            else:
+                enqueue_notification(None, f'bulk_status_{batch}', email,
+                                     f'[QuickDesk] {len(owned)} of your tickets are now {value}',
+                                     '\n'.join(f'#{row.id} "{row.subject}" is now {value}.' for row in owned))
+    return {'requested': len(ticket_ids), 'found': len(rows), 'updated': len(updated),
+            'unchanged': len(rows) - len(targets), 'conflicts': len(targets) - len(updated),
+            'ticket_ids': [row.id for row in updated]}
+
+# --- Voting ---
+def record_vote(user_id, ticket_id, value):
+    """Idempotently records a user's vote and returns 'new', 'changed' or 'unchanged'.
+
+    Every step is a single atomic statement (no read-modify-write), and the ticket counters are
+    adjusted with SET upvotes = upvotes + :n, so concurrent voters never lose updates.
+    """
+    inserted = db.session.execute(insert_ignoring_conflicts(
+        TicketVote, ['user_id', 'ticket_id'],
+        user_id=user_id, ticket_id=ticket_id, value=value, created_at=datetime.datetime.now()))
+    if inserted.rowcount:
+        outcome, up_delta, down_delta = 'new', int(value > 0), int(value < 0)
+    else:
+        switched = db.session.execute(
+            db.update(TicketVote)
+            .where(TicketVote.user_id == user_id, TicketVote.ticket_id == ticket_id, TicketVote.value != value)
+            .values(value=value))
+        if not switched.rowcount:
+            return 'unchanged'
+        outcome, up_delta, down_delta = 'changed', value, -value
+
+    db.session.execute(
+        db.update(Ticket)
+        .where(Ticket.id == ticket_id)
+        .values(upvotes=Ticket.upvotes + up_delta, downvotes=Ticket.downvotes + down_delta))
+    return outcome
@@ -0,0 +1,328 @@
+from flask import current_app
+import itertools
+import click
+import collections
+import csv
+import io
+import types
+import uuid
+import datetime
+import json
+from .extensions import db, password_hasher
+from .models import (
+    ArchivedComment, ArchivedTicket, Category, Comment, DataImport, ImportIdMap, Ticket, TicketEvent, User)
+from .caches import bump_cache_version
+from .search import SEARCH_INSERT_COMMENT, SEARCH_INSERT_TICKET, search_enabled
+from .tickets import adjust_ticket_stats, ticket_event_seed_rows
+
+# --- Data Export and Import ---
+# Exports stream rows with yield_per, so memory stays flat however large the tables are. NDJSON
+# carries every entity in one file (one {"entity": ..., ...} object per line, parents first); CSV is
+# one file per entity. The importer validates records and inserts them with executemany in batches
+# of IMPORT_BATCH_SIZE, one transaction per batch. Source ids are remapped to fresh ids; the id map
+# and the position reached in each input file are committed with every batch, so an interrupted
+# import resumes after the last committed batch.
+
+EXPORT_COLUMNS = { # Parents before children, the order the importer needs them in
+    'categories': (Category, ['id', 'name']),
+    'users': (User, ['id', 'username', 'email', 'role']),
+    'tickets': (Ticket, ['id', 'user_id', 'category_id', 'subject', 'description', 'status', 'assigned_agent_id',
+                         'created_at', 'updated_at', 'upvotes', 'downvotes', 'comment_count', 'first_response_at']),
+    'comments': (Comment, ['id', 'ticket_id', 'user_id', 'comment_text', 'created_at']),
+}
+IMPORT_FILLED_COLUMNS = {'password_hash'} # Required columns the importer can supply itself
+VALID_ROLES = ['end_user', 'support_agent', 'admin']
+VALID_STATUSES = ['Open', 'In Progress', 'Resolved', 'Closed']
+
+def export_columns(entity, include_password_hashes=False):
+    model, columns = EXPORT_COLUMNS[entity]
+    if entity == 'users' and include_password_hashes:
+        columns = columns + ['password_hash']
+    return model, columns
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+EXPORT_ARCHIVES = {'tickets': ArchivedTicket, 'comments': ArchivedComment} # Exported after the live rows
+
+def export_records(entity, include_password_hashes=False):
+    model, columns = export_columns(entity, include_password_hashes)
+    for source in [model] + ([EXPORT_ARCHIVES[entity]] if entity in EXPORT_ARCHIVES else []):
+        query = (db.select(*(getattr(source, name) for name in columns)).order_by(source.id)
+                 .execution_options(yield_per=current_app.config['EXPORT_BATCH_SIZE']))
+        for row in db.session.execute(query):
+            yield {name: export_value(value) for name, value in zip(columns, row)}
+
+def export_ndjson(entities, include_password_hashes=False):
+    for entity in entities:
+        for record in export_records(entity, include_password_hashes):
+            yield json.dumps({'entity': entity, **record}) + '\n'
+
+def export_csv(entity, include_password_hashes=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_columns(entity, include_password_hashes)[1])
+    for i, record in enumerate(export_records(entity, include_password_hashes), 1):
+        writer.writerow(['' if value is None else value for value in record.values()])
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def read_ndjson(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record.pop('entity', None), record
+
+def read_csv(path, entity):
+    with open(path, encoding='utf-8', newline='') as f:
+        for record in csv.DictReader(f):
+            yield entity, record
+
+class InvalidRecord(ValueError):
+    pass
+
+def fill_defaults(values, **defaults):
+    for name, default in defaults.items():
+        if values.get(name) is None:
+            values[name] = default
+
+class DataImporter:
+    """Imports exported records into this database, remapping ids. See the section comment above."""
+    def __init__(self, name, batch_size=None, max_errors=None):
+        self.name = name
+        self.batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+        self.max_errors = max_errors
+        self.errors = []
+        self.error_count = 0
+        self.imported = collections.Counter()
+        self.id_maps = {entity: {} for entity in EXPORT_COLUMNS}
+        for entity, source_id, target_id in db.session.execute(
+                db.select(ImportIdMap.entity, ImportIdMap.source_id, ImportIdMap.target_id)
+                .where(ImportIdMap.import_name == name)):
+            self.id_maps[entity][source_id] = target_id
+        self._unusable_hash = None
+
+    def run(self, stream, records):
+        """Imports one input file. Returns False when this file was already fully imported."""
+        checkpoint = db.session.get(DataImport, (self.name, stream))
+        if checkpoint is None:
+            checkpoint = DataImport(name=self.name, stream=stream, position=0, imported=0, rejected=0, status='running')
+            db.session.add(checkpoint)
+            db.session.commit()
+        elif checkpoint.status == 'done':
+            return False
+        position = checkpoint.position
+        batch = []
+        for entity, record in itertools.islice(records, position, None):
+            position += 1
+            batch.append((position, entity, record))
+            if len(batch) >= self.batch_size:
+                self._commit_batch(checkpoint, batch)
+                batch = []
+        self._commit_batch(checkpoint, batch, done=True)
+        return True
+
+    def _commit_batch(self, checkpoint, batch, done=False):
+        errors_before, imported_before = self.error_count, sum(self.imported.values())
+        try:
+            start = 0
+            for i in range(1, len(batch) + 1): # Consecutive records of one entity go in together
+                if i == len(batch) or batch[i][1] != batch[start][1]:
+                    self._import_group(checkpoint.stream, batch[start][1], batch[start:i])
+                    start = i
+            checkpoint.position += len(batch)
+            checkpoint.imported += sum(self.imported.values()) - imported_before
+            checkpoint.rejected += self.error_count - errors_before
+            checkpoint.status = 'done' if done else 'running'
+            checkpoint.updated_at = datetime.datetime.now()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _reject(self, stream, position, entity, message):
+        self.error_count += 1
+        if len(self.errors) < 100:
+            self.errors.append(f'{stream}:{position} ({entity}): {message}')
+        if self.max_errors is not None and self.error_count > self.max_errors:
+            raise click.ClickException(f'More than {self.max_errors} invalid records; stopping. '
+                                       f'First errors:\n' + '\n'.join(self.errors[:20]))
+
+    def _parse(self, model, name, value):
+        column = model.__table__.c[name]
+        if value is None or value == '':
+            if (not column.nullable and column.default is None and not column.primary_key
+                    and name not in IMPORT_FILLED_COLUMNS):
+                raise InvalidRecord(f'{name} is required')
+            return None
+        python_type = column.type.python_type
+        if python_type is datetime.datetime:
+            return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+        return python_type(value)
+
+    def _remap(self, entity, source_id, required=True):
+        if source_id is None:
+            if required:
+                raise InvalidRecord(f'missing {entity} reference')
+            return None
+        target = self.id_maps[entity].get(source_id)
+        if target is None:
+            raise InvalidRecord(f'unknown {entity[:-1]} id {source_id}')
+        return target
+
+    def _import_group(self, stream, entity, group):
+        if entity not in EXPORT_COLUMNS:
+            for position, _, _ in group:
+                self._reject(stream, position, entity, 'unknown entity')
+            return
+        model, columns = export_columns(entity, include_password_hashes=True)
+        rows = [] # (position, source id, values)
+        for position, _, record in group:
+            try:
+                # Every row carries every column (executemany needs identical keys); the
+                # _prepare_* methods fill in defaults for the ones left empty
+                values = {name: self._parse(model, name, record.get(name)) for name in columns}
+                source_id = values.pop('id')
+                if source_id is None and entity != 'comments':
+                    raise InvalidRecord('id is required')
+                rows.append((position, source_id, values))
+            except (InvalidRecord, ValueError, TypeError) as exc:
+                self._reject(stream, position, entity, exc)
+        rows = getattr(self, f'_prepare_{entity}')(stream, rows)
+        if not rows:
+            return
+        # Core executemany with RETURNING: multi-row INSERTs that hand back the new ids in order
+        table = model.__table__
+        new_ids = db.session.connection().execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True)
+            .execution_options(insertmanyvalues_page_size=self.batch_size),
+            [values for _, _, values in rows]).scalars().all()
+        getattr(self, f'_after_{entity}')(rows, new_ids)
+        if entity != 'comments': # Nothing refers to comments
+            db.session.connection().execute(db.insert(ImportIdMap.__table__), [
+                {'import_name': self.name, 'entity': entity, 'source_id': source_id, 'target_id': new_id}
+                for (_, source_id, _), new_id in zip(rows, new_ids)])
+            self.id_maps[entity].update((source_id, new_id) for (_, source_id, _), new_id in zip(rows, new_ids))
+        self.imported[entity] += len(rows)
+
+    def _prepare_categories(self, stream, rows):
+        # Categories that already exist here (by name) are reused rather than duplicated
+        names = [values['name'] for _, _, values in rows]
+        existing = dict(db.session.execute(db.select(Category.name, Category.id).where(Category.name.in_(names))).all())
+        fresh = []
+        for position, source_id, values in rows:
+            if values['name'] in existing:
+                self._map_existing('categories', source_id, existing[values['name']])
+            else:
+                existing[values['name']] = None
+                fresh.append((position, source_id, values))
+        return fresh
+
+    def _after_categories(self, rows, new_ids):
+        bump_cache_version('categories')
+
+    def _prepare_users(self, stream, rows):
+        # Accounts are matched by email; a username taken by a different email is rejected
+        emails = [values.get('email') for _, _, values in rows]
+        usernames = [values.get('username') for _, _, values in rows]
+        by_email = dict(db.session.execute(db.select(User.email, User.id).where(User.email.in_(emails))).all())
+        taken = set(db.session.execute(db.select(User.username).where(User.username.in_(usernames))).scalars())
+        fresh = []
+        for position, source_id, values in rows:
+            if values['email'] in by_email:
+                self._map_existing('users', source_id, by_email[values['email']])
+            elif values['username'] in taken:
+                self._reject(stream, position, 'users', f"username {values['username']!r} belongs to another account")
+            elif (values['role'] or 'end_user') not in VALID_ROLES:
+                self._reject(stream, position, 'users', f"invalid role {values.get('role')!r}")
+            else:
+                fill_defaults(values, role='end_user', password_hash=self.unusable_password_hash())
+                taken.add(values['username'])
+                by_email[values['email']] = None
+                fresh.append((position, source_id, values))
+        return fresh
+
+    def _after_users(self, rows, new_ids):
+        pass
+
+    def unusable_password_hash(self):
+        # Accounts exported without password hashes get a hash of a random secret: an admin has to
+        # set a new password before they can sign in
+        if self._unusable_hash is None:
+            self._unusable_hash = password_hasher.hash(uuid.uuid4().hex)
+        return self._unusable_hash
+
+    def _prepare_tickets(self, stream, rows):
+        fresh = []
+        for position, source_id, values in rows:
+            try:
+                values['user_id'] = self._remap('users', values.get('user_id'))
+                values['category_id'] = self._remap('categories', values.get('category_id'))
+                values['assigned_agent_id'] = self._remap('users', values.get('assigned_agent_id'), required=False)
+                fill_defaults(values, status='Open', created_at=datetime.datetime.now(), upvotes=0, downvotes=0)
+                fill_defaults(values, updated_at=values['created_at'])
+                if values['status'] not in VALID_STATUSES:
+                    raise InvalidRecord(f"invalid status {values['status']!r}")
+            except InvalidRecord as exc:
+                self._reject(stream, position, 'tickets', exc)
+                continue
+            values['comment_count'] = 0 # Counted as the ticket's comments are imported
+            fresh.append((position, source_id, values))
+        return fresh
+
+    def _after_tickets(self, rows, new_ids):
+        stat_deltas = collections.Counter()
+        tickets = []
+        for (_, _, values), new_id in zip(rows, new_ids):
+            stat_deltas[(values['category_id'], values['assigned_agent_id'], values['status'])] += 1
+            tickets.append(types.SimpleNamespace(id=new_id, **values))
+        for key, delta in stat_deltas.items():
+            adjust_ticket_stats(*key, delta)
+        events = ticket_event_seed_rows(tickets)
+        if events: # Core insert: the ORM would split rows with differing NULL columns into separate statements
+            db.session.connection().execute(db.insert(TicketEvent.__table__), events)
+        if search_enabled():
+            db.session.execute(SEARCH_INSERT_TICKET, [
+                {'rowid': t.id * 2, 'title': t.subject, 'body': t.description, 'ticket_id': t.id, 'owner_id': t.user_id}
+                for t in tickets])
+        bump_cache_version('tickets')
+
+    def _prepare_comments(self, stream, rows):
+        fresh = []
+        for position, source_id, values in rows:
+            try:
+                values['ticket_id'] = self._remap('tickets', values.get('ticket_id'))
+                values['user_id'] = self._remap('users', values.get('user_id'))
+            except InvalidRecord as exc:
+                self._reject(stream, position, 'comments', exc)
+                continue
+            fill_defaults(values, created_at=datetime.datetime.now())
+            fresh.append((position, source_id, values))
+        return fresh
+
+    def _after_comments(self, rows, new_ids):
+        per_ticket = collections.Counter(values['ticket_id'] for _, _, values in rows)
+        db.session.connection().execute(
+            db.update(Ticket).where(Ticket.id == db.bindparam('ticket'))
+            .values(comment_count=Ticket.comment_count + db.bindparam('added'),
+                    updated_at=Ticket.updated_at), # Keep the exported timestamp; counting is not an edit
+            [{'ticket': ticket_id, 'added': added} for ticket_id, added in per_ticket.items()])
+        if search_enabled():
+            owners = dict(db.session.execute(db.select(Ticket.id, Ticket.user_id)
+                                             .where(Ticket.id.in_(list(per_ticket)))).all())
+            db.session.execute(SEARCH_INSERT_COMMENT, [
+                {'rowid': new_id * 2 + 1, 'body': values['comment_text'], 'ticket_id': values['ticket_id'],
+                 'comment_id': new_id, 'owner_id': owners[values['ticket_id']]}
+                for (_, _, values), new_id in zip(rows, new_ids)])
+
+    def _map_existing(self, entity, source_id, target_id):
+        if target_id is None:
+            return # Duplicate inside this import; the first occurrence wins
+        if source_id not in self.id_maps[entity]:
+            db.session.execute(db.insert(ImportIdMap).values(import_name=self.name, entity=entity,
+                                                            source_id=source_id, target_id=target_id))
+            self.id_maps[entity][source_id] = target_id
@@ -0,0 +1,547 @@
+# bench.py
+"""QuickDesk benchmark harness.
+
+Seed a synthetic dataset, then drive the main routes and write latency, throughput and
+queries-per-request as JSON:
+
+    python bench.py seed --db bench.db                       # 10k users, 500k tickets, 5M comments
+    python bench.py seed --db bench-small.db --scale 0.01    # Same shape, 1% of the size
+    python bench.py run --db bench.db --output results.json
+    python bench.py run --db bench.db --mode http --processes 8 --duration 20 --baseline results.json
+    python bench.py coldstart --runs 30 --output coldstart.json
+
+--mode wsgi calls the app in-process through the Flask test client, one request at a time (server
+cost per request). --mode http starts `bench.py serve` (or targets --url) and loads it from
+several processes at once. The tree has no server-side templates, so views render a placeholder
+and the numbers cover view code and database work, not template rendering. coldstart times how long
+a fresh worker process takes to import the app, build it and answer its first request.
+"""
+from jinja2 import ChoiceLoader, FunctionLoader
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from http.cookies import SimpleCookie
+import multiprocessing
+import http.client
+import urllib.parse
+import numpy as np
+import subprocess
+import platform
+import tempfile
+import collections
+import datetime
+import socket
+import threading
+import click
+import json
+import time
+import sys
+import os
+from app import create_app
+from app.extensions import db, bcrypt
+from app.migrations import upgrade_database
+from app.models import Category, Comment, Ticket, TicketStat, User
+from app.search import rebuild_search_index
+from app.tickets import expected_ticket_stats
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BENCH_PASSWORD = 'bench-password'
+STATUSES = ['Open', 'In Progress', 'Resolved', 'Closed']
+STATUS_WEIGHTS = [0.15, 0.10, 0.25, 0.50]
+WORDS = ('printer network login password email outlook vpn laptop screen keyboard account reset error '
+         'install update crash slow timeout access denied license server backup restore sync mobile '
+         'invoice billing refund order shipping delivery report export import calendar meeting').split()
+PLACEHOLDER_TEMPLATE = '{% for message in get_flashed_messages() %}{% endfor %}ok'
+
+queries = threading.local() # Per thread, so the threaded bench server counts each request separately
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    queries.count = getattr(queries, 'count', 0) + 1
+
+def load_app(db_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(db_path)})
+    app.jinja_env.loader = ChoiceLoader([app.jinja_env.loader, FunctionLoader(lambda name: PLACEHOLDER_TEMPLATE)])
+    return app
+
+# --- Seeding ---
+
+def random_text(rng, count, low, high):
+    lengths = rng.integers(low, high, size=count)
+    picks = rng.integers(0, len(WORDS), size=int(lengths.sum()))
+    texts, start = [], 0
+    for length in lengths:
+        texts.append(' '.join(WORDS[i] for i in picks[start:start + length]))
+        start += length
+    return texts
+
+def zipf_weights(count, exponent):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+def seconds_to_datetimes(base, seconds):
+    return [base + datetime.timedelta(seconds=float(s)) for s in seconds]
+
+@click.group()
+def cli():
+    pass
+
+@cli.command()
+@click.option('--db', 'db_path', required=True, help='SQLite file to create.')
+@click.option('--users', default=10000, show_default=True)
+@click.option('--tickets', default=500000, show_default=True)
+@click.option('--comments', default=5000000, show_default=True)
+@click.option('--categories', default=12, show_default=True)
+@click.option('--scale', default=1.0, show_default=True, help='Multiplies users, tickets and comments.')
+@click.option('--seed', 'rng_seed', default=1, show_default=True)
+@click.option('--chunk-size', default=50000, show_default=True, help='Rows per bulk INSERT.')
+@click.option('--search-index/--no-search-index', default=True, show_default=True)
+@click.option('--overwrite', is_flag=True, help='Replace an existing database file.')
+def seed(db_path, users, tickets, comments, categories, scale, rng_seed, chunk_size, search_index, overwrite):
+    """Create a synthetic dataset with realistic category, status and activity skew."""
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise click.ClickException(f'{db_path} exists; pass --overwrite to replace it.')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    users, tickets, comments = (max(1, int(n * scale)) for n in (users, tickets, comments))
+    rng = np.random.default_rng(rng_seed)
+    app = load_app(db_path)
+    started = time.perf_counter()
+    with app.app_context():
+        upgrade_database()
+        password_hash = bcrypt.generate_password_hash(BENCH_PASSWORD).decode('utf-8')
+        now = datetime.datetime.now().replace(microsecond=0)
+        year_ago = now - datetime.timedelta(days=365)
+
+        # Users: ~1% admins, ~2% agents, the rest end users
+        admins, agents = max(1, users // 100), max(1, users // 50)
+        roles = ['admin'] * admins + ['support_agent'] * agents + ['end_user'] * max(1, users - admins - agents)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            conn.execute(db.insert(User), [
+                {'id': i + 1, 'username': f'bench{i + 1}', 'email': f'user{i + 1}@bench.local',
+                 'password_hash': password_hash, 'role': role} for i, role in enumerate(roles)])
+            conn.execute(db.insert(Category), [{'id': i + 1, 'name': f'Category {i + 1}'} for i in range(categories)])
+        agent_ids = np.arange(admins + 1, admins + agents + 1)
+        end_user_ids = np.arange(admins + agents + 1, len(roles) + 1)
+
+        # Tickets: a few heavy reporters and categories, most tickets closed, comment volume log-normal
+        owner = rng.choice(end_user_ids, size=tickets, p=zipf_weights(len(end_user_ids), 0.8))
+        category = rng.choice(np.arange(1, categories + 1), size=tickets, p=zipf_weights(categories, 1.1))
+        status = rng.choice(len(STATUSES), size=tickets, p=STATUS_WEIGHTS)
+        assigned = np.where((status == 0) & (rng.random(tickets) < 0.5), 0, rng.choice(agent_ids, size=tickets))
+        created = np.sort(rng.uniform(0, 365 * 86400, size=tickets))
+        lifetime = np.minimum(rng.exponential(3 * 86400, size=tickets), 365 * 86400 - created)
+        activity = rng.lognormal(0, 1, size=tickets)
+        comment_count = rng.multinomial(comments, activity / activity.sum())
+        # First reply from an agent is the second comment of each thread
+        first_response = np.where(comment_count >= 2, created + lifetime * 2 / (comment_count + 1), np.nan)
+
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            for start in range(0, tickets, chunk_size):
+                stop = min(start + chunk_size, tickets)
+                descriptions = random_text(rng, stop - start, 8, 40)
+                created_at = seconds_to_datetimes(year_ago, created[start:stop])
+                updated_at = seconds_to_datetimes(year_ago, created[start:stop] + lifetime[start:stop])
+                conn.execute(db.insert(Ticket), [
+                    {'id': i + 1, 'user_id': int(owner[i]), 'category_id': int(category[i]),
+                     'subject': f'Bench ticket {i + 1}: {descriptions[i - start][:60]}',
+                     'description': descriptions[i - start], 'status': STATUSES[status[i]],
+                     'assigned_agent_id': int(assigned[i]) or None,
+                     'created_at': created_at[i - start], 'updated_at': updated_at[i - start],
+                     'upvotes': 0, 'downvotes': 0, 'comment_count': int(comment_count[i]),
+                     'first_response_at': (None if np.isnan(first_response[i])
+                                           else year_ago + datetime.timedelta(seconds=float(first_response[i])))}
+                    for i in range(start, stop)])
+
+            # Comments alternate between the owner and an agent, spread over the ticket's lifetime
+            ticket_of_comment = np.repeat(np.arange(tickets), comment_count)
+            position = np.arange(comments) - np.repeat(np.cumsum(comment_count) - comment_count, comment_count)
+            comment_time = (created[ticket_of_comment] + lifetime[ticket_of_comment]
+                            * (position + 1) / (comment_count[ticket_of_comment] + 1))
+            responder = np.where(assigned > 0, assigned, rng.choice(agent_ids, size=tickets))
+            author = np.where(position % 2 == 0, owner[ticket_of_comment], responder[ticket_of_comment])
+            for start in range(0, comments, chunk_size):
+                stop = min(start + chunk_size, comments)
+                texts = random_text(rng, stop - start, 5, 30)
+                created_at = seconds_to_datetimes(year_ago, comment_time[start:stop])
+                conn.execute(db.insert(Comment), [
+                    {'id': i + 1, 'ticket_id': int(ticket_of_comment[i]) + 1, 'user_id': int(author[i]),
+                     'comment_text': texts[i - start], 'created_at': created_at[i - start]}
+                    for i in range(start, stop)])
+                click.echo(f'  comments {stop}/{comments}')
+
+            # Derived tables the app otherwise maintains incrementally
+            for (scope, scope_id, stat_status), count in expected_ticket_stats(conn).items():
+                conn.execute(db.insert(TicketStat).values(scope=scope, scope_id=scope_id, status=stat_status, count=count))
+            if search_index:
+                rebuild_search_index(conn)
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('ANALYZE')
+    click.echo(f'Seeded {len(roles)} users, {tickets} tickets and {comments} comments '
+               f'in {time.perf_counter() - started:.1f}s. Every user\'s password is "{BENCH_PASSWORD}".')
+
+# --- Scenarios ---
+# Each scenario names the role it runs as and builds (method, path, form) from a random generator
+# and the sampled ids, so the WSGI and HTTP drivers issue exactly the same requests.
+
+def build_scenarios():
+    def get(path):
+        return lambda rng, ids: ('GET', path, None)
+    return {
+        'user_dashboard[recently_modified]': ('end_user', get('/dashboard/user?sort_by=recently_modified')),
+        'user_dashboard[most_replied]': ('end_user', get('/dashboard/user?sort_by=most_replied')),
+        'agent_dashboard[all]': ('support_agent', get('/dashboard/agent?assigned=all')),
+        'agent_dashboard[mine]': ('support_agent', get('/dashboard/agent?assigned=mine')),
+        'agent_dashboard[unassigned]': ('support_agent', get('/dashboard/agent?assigned=unassigned')),
+        'ticket_detail': ('support_agent',
+                          lambda rng, ids: ('GET', f"/ticket/{rng.choice(ids['tickets'])}", None)),
+        'add_comment': ('support_agent',
+                        lambda rng, ids: ('POST', f"/ticket/{rng.choice(ids['tickets'])}/comment",
+                                          {'comment_text': ' '.join(rng.choice(WORDS, size=12))})),
+        'vote_ticket': ('end_user',
+                        lambda rng, ids: ('POST', f"/ticket/{rng.choice(ids['tickets'])}/vote/"
+                                                  f"{rng.choice(['upvote', 'downvote'])}", None)),
+        'login': (None,
+                  lambda rng, ids: ('POST', '/login', {'email': rng.choice(ids['end_user_emails']),
+                                                       'password': BENCH_PASSWORD})),
+    }
+
+def sample_ids(app, rng):
+    with app.app_context():
+        max_ticket = db.session.query(db.func.max(Ticket.id)).scalar() or 0
+        emails = {role: [email for (email,) in db.session.query(User.email).filter_by(role=role)
+                         .order_by(db.func.random()).limit(200)]
+                  for role in ('end_user', 'support_agent')}
+        counts = {name: db.session.query(db.func.count(model.id)).scalar()
+                  for name, model in (('users', User), ('tickets', Ticket), ('comments', Comment))}
+    if not max_ticket or not emails['end_user'] or not emails['support_agent']:
+        raise click.ClickException('The database has no tickets, end users or agents; run `bench.py seed` first.')
+    return ({'tickets': rng.integers(1, max_ticket + 1, size=1000).tolist(),
+             'end_user_emails': emails['end_user'], 'support_agent_emails': emails['support_agent']}, counts)
+
+def summarize(latencies, statuses, query_counts, elapsed):
+    latencies = np.asarray(latencies) * 1000
+    statuses = np.asarray(statuses)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (None, None, None)
+    return {'requests': int(len(latencies)), 'errors': int(((statuses >= 400) | (statuses == 0)).sum()),
+            'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+            'mean_ms': float(latencies.mean()) if len(latencies) else None,
+            'throughput_rps': len(latencies) / elapsed if elapsed else None,
+            'queries_per_request': float(np.mean(query_counts)) if query_counts else None}
+
+def run_wsgi(app, scenarios, ids, rng, requests, warmup):
+    results = {}
+    for name, (role, build) in scenarios.items():
+        client = app.test_client()
+        if role:
+            client.post('/login', data={'email': ids[f'{role}_emails'][0], 'password': BENCH_PASSWORD})
+        latencies, statuses, query_counts = [], [], []
+        started = time.perf_counter()
+        for i in range(warmup + requests):
+            method, path, form = build(rng, ids)
+            if name == 'login':
+                client = app.test_client() # A fresh, logged-out browser each time
+            queries.count = 0
+            begin = time.perf_counter()
+            response = client.open(path, method=method, data=form)
+            took = time.perf_counter() - begin
+            response.close()
+            if i == warmup:
+                started = time.perf_counter() - took
+            if i >= warmup:
+                latencies.append(took)
+                statuses.append(response.status_code)
+                query_counts.append(queries.count)
+        results[name] = summarize(latencies, statuses, query_counts, time.perf_counter() - started)
+        click.echo(f"{name:40} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                   f"{results[name]['queries_per_request']:.1f} queries")
+    return results
+
+# --- HTTP load generator ---
+
+class HttpSession:
+    """One keep-alive connection plus the session cookie, like a single browser tab."""
+    def __init__(self, base_url):
+        url = urllib.parse.urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, form=None):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={morsel.value}' for key, morsel in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.connection.close() # Server closed the keep-alive connection; retry once on a new one
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(header)
+        return response
+
+def http_worker(args):
+    base_url, name, worker_index, duration, ids, rng_seed = args
+    role, build = build_scenarios()[name]
+    rng = np.random.default_rng(rng_seed)
+    session = HttpSession(base_url)
+    if role:
+        emails = ids[f'{role}_emails']
+        session.request('POST', '/login', {'email': emails[worker_index % len(emails)], 'password': BENCH_PASSWORD})
+    latencies, statuses, query_counts = [], [], []
+    window_start = time.time()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        method, path, form = build(rng, ids)
+        if name == 'login':
+            session.cookies = SimpleCookie()
+        begin = time.perf_counter()
+        try:
+            response = session.request(method, path, form)
+            status, query_count = response.status, response.getheader('X-Bench-Queries')
+        except (http.client.HTTPException, OSError):
+            status, query_count = 0, None
+        latencies.append(time.perf_counter() - begin)
+        statuses.append(status)
+        if query_count is not None:
+            query_counts.append(int(query_count))
+    return latencies, statuses, query_counts, (window_start, time.time())
+
+def run_http(base_url, scenarios, ids, processes, duration, rng_seed):
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes) as pool:
+        for name in scenarios:
+            chunks = pool.map(http_worker, [(base_url, name, i, duration, ids, rng_seed + i) for i in range(processes)])
+            # Throughput over the window the workers were actually sending, not pool start-up
+            elapsed = max(c[3][1] for c in chunks) - min(c[3][0] for c in chunks)
+            results[name] = summarize([x for c in chunks for x in c[0]], [x for c in chunks for x in c[1]],
+                                      [x for c in chunks for x in c[2]], elapsed)
+            click.echo(f"{name:40} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                       f"{results[name]['throughput_rps']:8.1f} req/s")
+    return results
+
+def wait_for_port(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise click.ClickException(f'Server on {host}:{port} did not start within {timeout}s.')
+
+@cli.command()
+@click.option('--db', 'db_path', required=True)
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=5055, show_default=True)
+@click.option('--processes', default=1, show_default=True,
+              help='Forked server processes (1 = threaded). Werkzeug forks per connection, so >1 mostly measures fork cost.')
+def serve(db_path, host, port, processes):
+    """Serve the app for --mode http, reporting per-request query counts in X-Bench-Queries."""
+    from werkzeug.serving import run_simple
+    app = load_app(db_path)
+    app.config['TESTING'] = True # Let view errors surface as 500s in the results rather than debug pages
+
+    @app.before_request
+    def reset_query_count():
+        queries.count = 0
+
+    @app.after_request
+    def report_query_count(response):
+        response.headers['X-Bench-Queries'] = str(queries.count)
+        return response
+
+    run_simple(host, port, app, threaded=processes == 1, processes=processes)
+
+# --- Cold start ---
+# Each probe is a fresh interpreter, like a newly forked or recycled worker. It records the time to
+# `import app`, to build the app with create_app(), and to serve its first request, and counts the
+# SQL statements issued on the way: a worker must boot without touching the database.
+
+COLDSTART_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+flask_app = app.create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+startup_statements = len(statements)
+status = flask_app.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'first_request_ms': (served - created) * 1000, 'startup_statements': startup_statements,
+                  'status': status}))
+"""
+
+def top_imports(config, count):
+    # -X importtime lines: "import time: <self us> | <cumulative us> | <indented module name>"
+    probe = subprocess.run([sys.executable, '-X', 'importtime', '-c', COLDSTART_PROBE, json.dumps(config)],
+                           cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = []
+    for line in probe.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit() and not parts[2].startswith('  '):
+            modules.append((int(parts[1]) / 1000, parts[2].strip()))
+    return [{'module': name, 'cumulative_ms': ms} for ms, name in sorted(modules, reverse=True)[:count]]
+
+@cli.command()
+@click.option('--runs', default=20, show_default=True, help='Fresh interpreters to start.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Write results JSON here.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Earlier coldstart JSON to compare p95 times against.')
+@click.option('--tolerance', default=0.2, show_default=True, help='Allowed p95 slowdown before failing.')
+def coldstart(runs, output, baseline, tolerance):
+    """Measure worker boot: interpreter start, `import app`, create_app() and the first request."""
+    if baseline:
+        with open(baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('mode') != 'coldstart':
+            raise click.ClickException(f"The baseline was recorded in {baseline.get('mode')} mode, not coldstart.")
+    with tempfile.TemporaryDirectory() as scratch:
+        # Points at a database that does not exist: booting must neither need nor create it
+        db_path = os.path.join(scratch, 'absent.db')
+        config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path}
+        samples = collections.defaultdict(list)
+        for _ in range(runs):
+            begin = time.perf_counter()
+            probe = subprocess.run([sys.executable, '-c', COLDSTART_PROBE, json.dumps(config)],
+                                   cwd=ROOT, capture_output=True, text=True)
+            samples['process'].append(time.perf_counter() - begin)
+            if probe.returncode:
+                raise click.ClickException(f'Cold start probe failed:\n{probe.stderr}')
+            timings = json.loads(probe.stdout)
+            if timings['startup_statements'] or os.path.exists(db_path):
+                raise click.ClickException(f"create_app() touched the database "
+                                           f"({timings['startup_statements']} statement(s)).")
+            for phase in ('import', 'create_app', 'first_request'):
+                samples[phase].append(timings[f'{phase}_ms'] / 1000)
+        imports = top_imports(config, 10)
+    results = {}
+    for phase, latencies in samples.items():
+        results[phase] = summarize(latencies, [200] * len(latencies), [], 0)
+        click.echo(f"{phase:40} p50 {results[phase]['p50_ms']:8.2f} ms  p95 {results[phase]['p95_ms']:8.2f} ms")
+    report = {'created_at': datetime.datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+              'mode': 'coldstart', 'python': platform.python_version(), 'settings': {'runs': runs},
+              'scenarios': results, 'slowest_imports': imports}
+    regressions = []
+    if baseline:
+        regressions = compare_to_baseline(results, baseline, tolerance)
+        report['regressions'] = regressions
+    text = json.dumps(report, indent=2, default=float)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        click.echo(text)
+    if regressions:
+        raise click.ClickException('p95 regressions against the baseline:\n  ' + '\n  '.join(regressions))
+
+# --- Running and comparing ---
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not previous.get('p95_ms') or current.get('p95_ms') is None:
+            continue
+        ratio = current['p95_ms'] / previous['p95_ms']
+        current['baseline_p95_ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+@cli.command()
+@click.option('--db', 'db_path', required=True)
+@click.option('--mode', type=click.Choice(['wsgi', 'http']), default='wsgi', show_default=True)
+@click.option('--scenario', 'only', multiple=True, help='Run only these scenarios (repeatable).')
+@click.option('--requests', default=200, show_default=True, help='Requests per scenario (wsgi).')
+@click.option('--warmup', default=20, show_default=True, help='Unmeasured requests per scenario (wsgi).')
+@click.option('--processes', default=4, show_default=True, help='Load generator processes (http).')
+@click.option('--duration', default=10.0, show_default=True, help='Seconds per scenario (http).')
+@click.option('--url', default=None, help='Load an already running server instead of starting one (http).')
+@click.option('--server-processes', default=1, show_default=True, help='Processes for the spawned server (http).')
+@click.option('--seed', 'rng_seed', default=1, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Write results JSON here.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Earlier results JSON to compare p95 latencies against.')
+@click.option('--tolerance', default=0.2, show_default=True, help='Allowed p95 slowdown before failing.')
+def run(db_path, mode, only, requests, warmup, processes, duration, url, server_processes, rng_seed,
+        output, baseline, tolerance):
+    """Benchmark the routes and report p50/p95/p99 latency, throughput and queries per request."""
+    scenarios = build_scenarios()
+    unknown = set(only) - set(scenarios)
+    if unknown:
+        raise click.ClickException(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+    scenarios = {name: spec for name, spec in scenarios.items() if not only or name in only}
+    if baseline:
+        with open(baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('mode') != mode:
+            raise click.ClickException(f"The baseline was recorded in {baseline.get('mode')} mode, not {mode}.")
+    rng = np.random.default_rng(rng_seed)
+    app = load_app(db_path)
+    ids, dataset = sample_ids(app, rng)
+
+    if mode == 'wsgi':
+        app.config['TESTING'] = True
+        results = run_wsgi(app, scenarios, ids, rng, requests, warmup)
+    else:
+        server = None
+        if not url:
+            port = 5055
+            server = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', '--db', db_path,
+                                       '--port', str(port), '--processes', str(server_processes)],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            url = f'http://127.0.0.1:{port}'
+        try:
+            parts = urllib.parse.urlsplit(url)
+            wait_for_port(parts.hostname, parts.port or 80, timeout=30)
+            results = run_http(url, scenarios, ids, processes, duration, rng_seed)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    report = {'created_at': datetime.datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+              'mode': mode, 'python': platform.python_version(), 'dataset': dataset,
+              'settings': {'requests': requests, 'warmup': warmup, 'processes': processes, 'duration': duration,
+                           'server_processes': server_processes, 'url': url if mode == 'http' else None},
+              'scenarios': results}
+    regressions = []
+    if baseline:
+        regressions = compare_to_baseline(results, baseline, tolerance)
+        report['regressions'] = regressions
+    text = json.dumps(report, indent=2, default=float)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        click.echo(text)
+    if regressions:
+        raise click.ClickException('p95 regressions against the baseline:\n  ' + '\n  '.join(regressions))
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,34 @@
+import pytest
+from app import create_app
+from app.caches import category_registry, user_cache
+from app.extensions import db
+from app.migrations import upgrade_database
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Builds an app on its own migrated SQLite database under tmp_path."""
+    def make_app(name='quickdesk', **config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / (name + '.db')}",
+            'DATABASE_REPLICA_URL': None,
+            'ATTACHMENT_FOLDER': str(tmp_path / name / 'attachments'),
+            'BCRYPT_LOG_ROUNDS': 4,
+            'MAIL_BACKEND': 'console',
+            **config,
+        })
+        # The caches are per process, so entries from an earlier test's database must not leak in
+        category_registry.invalidate()
+        user_cache.invalidate()
+        with app.app_context():
+            upgrade_database() # The same path a deployment takes, so the tests see every migration
+        return app
+    return make_app
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,75 @@
+import datetime
+import pytest
+from jinja2 import ChoiceLoader, DictLoader
+from app.archive import archive_ticket_batch
+from app.extensions import db
+from app.models import ArchivedComment, Attachment, Category, Comment, Ticket, User
+from app.search import index_comment_for_search
+
+@pytest.fixture
+def owner(app):
+    user = User(username='customer', email='customer@example.com', password_hash='x', role='end_user')
+    db.session.add_all([user, Category(name='Billing')])
+    db.session.commit()
+    return user
+
+def closed_ticket(owner, days_ago, comments=0):
+    at = datetime.datetime.now() - datetime.timedelta(days=days_ago)
+    ticket = Ticket(user_id=owner.id, category_id=1, subject='s', description='d', status='Closed',
+                    created_at=at, updated_at=at, comment_count=comments)
+    db.session.add(ticket)
+    db.session.flush()
+    db.session.add_all([Comment(ticket_id=ticket.id, user_id=owner.id, comment_text=f'c{i}', created_at=at)
+                        for i in range(comments)])
+    db.session.commit()
+    return ticket.id
+
+def archive_all():
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=30)
+    while archive_ticket_batch(cutoff, 100)[0]:
+        pass
+
+def signed_in_client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+@pytest.mark.parametrize('path', ['/ticket/{id}', '/ticket/{id}/comments'])
+def test_archiving_invalidates_cached_ticket_pages(app, owner, path):
+    app.jinja_loader = ChoiceLoader([DictLoader({'tickets/ticket_detail.html': '{{ archived }}'}), app.jinja_loader])
+    ticket_id = closed_ticket(owner, days_ago=60, comments=2)
+    client = signed_in_client(app, owner)
+    headers = {'Accept': 'application/json'}
+    first = client.get(path.format(id=ticket_id), headers=headers)
+    assert first.status_code == 200
+    validators = {'If-None-Match': first.headers['ETag'], 'If-Modified-Since': first.headers['Last-Modified']}
+    assert client.get(path.format(id=ticket_id), headers={**headers, **validators}).status_code == 304
+
+    archive_all()
+    assert db.session.get(Ticket, ticket_id) is None
+    # A browser revalidating its copy of the live page gets the read-only archived page, not a 304
+    assert client.get(path.format(id=ticket_id), headers={**headers, **validators}).status_code == 200
+    assert client.get(path.format(id=ticket_id),
+                      headers={**headers, 'If-Modified-Since': first.headers['Last-Modified']}).status_code == 200
+
+def test_archived_ids_are_not_handed_out_again(app, owner):
+    archived_id = closed_ticket(owner, days_ago=60, comments=2) # Comments 1 and 2
+    live_id = closed_ticket(owner, days_ago=1, comments=1) # Comment 3, the newest
+    first_comment = db.session.get(Comment, 1)
+    index_comment_for_search(first_comment, first_comment.ticket)
+    db.session.add(Attachment(ticket_id=archived_id, comment_id=1, uploaded_by=owner.id, sha256='0' * 64,
+                              filename='invoice.pdf', content_type='application/pdf', size=1))
+    db.session.commit()
+    archive_all()
+    assert db.session.get(ArchivedComment, 1) is not None
+
+    client = signed_in_client(app, owner)
+    assert client.post('/comment/3/delete').status_code == 302
+    assert client.post(f'/ticket/{live_id}/comment', data={'comment_text': 'again'}).status_code == 302
+    # With max(id) + 1 the new comment would have been 1, the archived comment's id
+    assert db.session.scalars(db.select(Comment.id)).all() == [4]
+    assert db.session.scalars(db.select(Attachment.comment_id)).all() == [1]
+    assert db.session.execute(db.text('SELECT ticket_id FROM search_index WHERE comment_id = 1')).scalars().all() \
+        == [archived_id]
@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy import event
+from app.extensions import db
+from app.models import Category, LiveEvent, Ticket, User
+
+@pytest.fixture
+def desk(app):
+    users = {role: User(username=role, email=f'{role}@example.com', password_hash='x', role=role)
+             for role in ('end_user', 'support_agent', 'admin')}
+    other_agent = User(username='agent2', email='agent2@example.com', password_hash='x', role='support_agent')
+    category = Category(name='Billing')
+    db.session.add_all([*users.values(), other_agent, category])
+    db.session.flush()
+    ticket = Ticket(user_id=users['end_user'].id, category_id=category.id, subject='s', description='d',
+                    status='Open', assigned_agent_id=users['support_agent'].id)
+    db.session.add(ticket)
+    db.session.commit()
+    app.test_cli_runner().invoke(args=['reconcile-ticket-stats']) # Counters for the seeded ticket
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(users['admin'].id)
+        session['_fresh'] = True
+    return client, ticket.id, users['support_agent'].id, other_agent.id
+
+def stats_in_sync(app):
+    result = app.test_cli_runner().invoke(args=['reconcile-ticket-stats', '--dry-run'])
+    return 'matches the ticket table' in result.output
+
+def ticket_state(ticket_id):
+    db.session.expire_all()
+    ticket = db.session.get(Ticket, ticket_id)
+    return ticket.assigned_agent_id, ticket.status, ticket.updated_at
+
+def live_event_count():
+    return db.session.scalar(db.select(db.func.count(LiveEvent.id)))
+
+def concurrent_change(sql, params):
+    # Runs `sql` on the same connection right before the route's conditional UPDATE, as if another
+    # request had committed it between the route's read and its write
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE ticket SET') and not fired:
+            fired.append(True)
+            cursor.execute(sql, params)
+    fired = []
+    return before_cursor_execute
+
+def test_reassign_moves_stats_and_publishes(app, desk):
+    client, ticket_id, agent_id, other_agent_id = desk
+    client.post(f'/ticket/{ticket_id}/assign', data={'agent_id': other_agent_id})
+    assert ticket_state(ticket_id)[0] == other_agent_id
+    assert live_event_count() == 1
+    assert stats_in_sync(app)
+
+def test_assigning_the_same_agent_changes_nothing(app, desk):
+    client, ticket_id, agent_id, _ = desk
+    before = ticket_state(ticket_id)
+    client.post(f'/ticket/{ticket_id}/assign', data={'agent_id': agent_id})
+    assert ticket_state(ticket_id) == before
+    assert live_event_count() == 0
+    assert stats_in_sync(app)
+
+@pytest.mark.parametrize('url, data, sql', [
+    ('/ticket/{id}/assign', {'agent_id': '{other}'}, "UPDATE ticket SET status = 'Closed' WHERE id = ?"),
+    ('/ticket/{id}/assign', {'agent_id': ''}, 'UPDATE ticket SET assigned_agent_id = NULL WHERE id = ?'),
+    ('/ticket/{id}/update_status', {'new_status': 'Resolved'}, 'UPDATE ticket SET assigned_agent_id = NULL WHERE id = ?'),
+], ids=['assign-after-status-change', 'unassign-after-unassign', 'status-after-unassign'])
+def test_concurrent_change_leaves_stats_consistent(app, desk, url, data, sql):
+    client, ticket_id, _, other_agent_id = desk
+    data = {key: value.format(other=other_agent_id) for key, value in data.items()}
+    listener = concurrent_change(sql, (ticket_id,))
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        client.post(url.format(id=ticket_id), data=data)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert live_event_count() == 0
+    assert stats_in_sync(app)
+
+@pytest.mark.parametrize('filters', [{'status': 'Reopened'}, {'category': 'Biling'}, {'assigned': 'theirs'}])
+def test_bulk_filter_refuses_unknown_filters(app, desk, filters):
+    client, ticket_id, _, _ = desk
+    before = ticket_state(ticket_id)
+    response = client.post('/tickets/bulk', headers={'Accept': 'application/json'},
+                           data={'action': 'status', 'new_status': 'Closed', 'select': 'filter', **filters})
+    # Dropping the unknown filter would close every ticket instead of none
+    assert response.status_code == 400
+    assert ticket_state(ticket_id) == before
+
+def test_bulk_filter_applies_known_filters(app, desk):
+    client, ticket_id, _, _ = desk
+    response = client.post('/tickets/bulk', headers={'Accept': 'application/json'},
+                           data={'action': 'status', 'new_status': 'Closed', 'select': 'filter',
+                                 'status': 'Open', 'category': 'Billing', 'assigned': 'all'})
+    assert response.get_json()['updated'] == 1
+    assert ticket_state(ticket_id)[1] == 'Closed'
+    assert stats_in_sync(app)
@@ -0,0 +1,45 @@
+import hashlib
+import io
+import os
+from app.extensions import db
+from app.models import Attachment, Category, Comment, Ticket, User
+from app.attachments import attachment_path
+
+def signed_in_client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+def comment_with_files(client, ticket_id, files):
+    client.post(f'/ticket/{ticket_id}/comment', content_type='multipart/form-data', data={
+        'comment_text': 'see attached',
+        'attachment': [(io.BytesIO(content), name) for name, content in files]})
+    return db.session.scalar(db.select(db.func.max(Comment.id)))
+
+def blob_exists(content):
+    return os.path.exists(attachment_path(hashlib.sha256(content).hexdigest()))
+
+def test_deleting_a_comment_removes_its_attachments_and_orphaned_blobs(app):
+    user = User(username='customer', email='customer@example.com', password_hash='x', role='end_user')
+    category = Category(name='Billing')
+    db.session.add_all([user, category])
+    db.session.flush()
+    ticket = Ticket(user_id=user.id, category_id=category.id, subject='s', description='d')
+    db.session.add(ticket)
+    db.session.commit()
+    client = signed_in_client(app, user)
+
+    first = comment_with_files(client, ticket.id, [('shared.txt', b'shared'), ('only.txt', b'only here')])
+    second = comment_with_files(client, ticket.id, [('copy.txt', b'shared')])
+    assert blob_exists(b'shared') and blob_exists(b'only here')
+
+    client.post(f'/comment/{first}/delete')
+    assert db.session.scalar(db.select(db.func.count()).where(Attachment.comment_id == first)) == 0
+    assert not blob_exists(b'only here')
+    assert blob_exists(b'shared') # Still referenced by the second comment
+
+    client.post(f'/comment/{second}/delete')
+    assert db.session.scalar(db.select(db.func.count(Attachment.id))) == 0
+    assert not blob_exists(b'shared')
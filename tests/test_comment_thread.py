@@ -0,0 +1,36 @@
+import datetime
+import pytest
+from app.extensions import db
+from app.models import Category, Comment, Ticket, User
+
+@pytest.fixture
+def thread(app):
+    app.config['COMMENTS_PER_PAGE'] = 2
+    user = User(username='customer', email='customer@example.com', password_hash='x', role='end_user')
+    db.session.add_all([user, Category(name='Billing')])
+    db.session.flush()
+    ticket = Ticket(user_id=user.id, category_id=1, subject='s', description='d', status='Open', comment_count=3)
+    db.session.add(ticket)
+    db.session.flush()
+    start = datetime.datetime(2024, 1, 1)
+    db.session.add_all([Comment(ticket_id=ticket.id, user_id=user.id, comment_text=f'c{i}',
+                                created_at=start + datetime.timedelta(minutes=i)) for i in range(3)])
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client, ticket.id
+
+@pytest.mark.parametrize('accept', ['application/json', '*/*'])
+def test_comment_pages_are_json(thread, accept):
+    client, ticket_id = thread
+    newest = client.get(f'/ticket/{ticket_id}/comments', headers={'Accept': accept})
+    assert newest.status_code == 200
+    assert newest.mimetype == 'application/json'
+    assert [c['text'] for c in newest.get_json()['comments']] == ['c1', 'c2']
+
+    cursor = newest.get_json()['earlier_cursor']
+    earlier = client.get(f'/ticket/{ticket_id}/comments', query_string={'earlier': cursor}, headers={'Accept': accept})
+    assert [c['text'] for c in earlier.get_json()['comments']] == ['c0']
+    assert earlier.get_json()['earlier_cursor'] is None
@@ -0,0 +1,50 @@
+import datetime
+from app.extensions import db
+from app.models import Category, Comment, Ticket, User
+
+def seed(now):
+    customer = User(username='customer', email='customer@example.com', password_hash='x', role='end_user')
+    agent = User(username='agent', email='agent@example.com', password_hash='x', role='support_agent')
+    category = Category(name='Billing')
+    db.session.add_all([customer, agent, category])
+    db.session.flush()
+    for i in range(3):
+        created = now - datetime.timedelta(days=30 - i)
+        ticket = Ticket(user_id=customer.id, category_id=category.id, subject=f'ticket {i}', description='d',
+                        status='Resolved' if i else 'Open', assigned_agent_id=agent.id if i else None,
+                        created_at=created, updated_at=created + datetime.timedelta(days=2, minutes=i),
+                        comment_count=2, first_response_at=created + datetime.timedelta(hours=1))
+        db.session.add(ticket)
+        db.session.flush()
+        db.session.add_all([
+            Comment(ticket_id=ticket.id, user_id=agent.id, comment_text='a', created_at=created + datetime.timedelta(hours=1)),
+            Comment(ticket_id=ticket.id, user_id=customer.id, comment_text='b', created_at=created + datetime.timedelta(days=1)),
+        ])
+    db.session.commit()
+
+def ticket_rows():
+    return {row.subject: row for row in db.session.execute(
+        db.select(Ticket.subject, Ticket.created_at, Ticket.updated_at, Ticket.first_response_at,
+                  Ticket.comment_count, Ticket.status))}
+
+def comment_rows():
+    return sorted(db.session.execute(db.select(Ticket.subject, Comment.comment_text, Comment.created_at)
+                                     .join(Ticket, Comment.ticket_id == Ticket.id)).all())
+
+def test_round_trip_preserves_timestamps(make_app, tmp_path):
+    export_path = str(tmp_path / 'export.ndjson')
+    source = make_app('source')
+    with source.app_context():
+        seed(datetime.datetime.now().replace(microsecond=0))
+        expected_tickets, expected_comments = ticket_rows(), comment_rows()
+        result = source.test_cli_runner().invoke(args=['export-data', export_path])
+        assert result.exit_code == 0, result.output
+        db.session.remove()
+
+    target = make_app('target')
+    with target.app_context():
+        result = target.test_cli_runner().invoke(args=['import-data', export_path])
+        assert result.exit_code == 0, result.output
+        assert ticket_rows() == expected_tickets
+        assert comment_rows() == expected_comments
+        db.session.remove()
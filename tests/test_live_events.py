@@ -0,0 +1,37 @@
+import datetime
+from app.extensions import db
+from app.models import LiveEvent
+from app.live import live_broker, live_event_pruner, publish_event
+
+def add_old_events(count, age):
+    created_at = datetime.datetime.now() - datetime.timedelta(seconds=age)
+    db.session.execute(db.insert(LiveEvent), [
+        {'kind': 'status', 'topics': 'queue:all', 'payload': '{}', 'created_at': created_at} for _ in range(count)])
+    db.session.commit()
+
+def live_event_count():
+    return db.session.scalar(db.select(db.func.count(LiveEvent.id)))
+
+def test_publishing_prunes_expired_events_without_subscribers(app, monkeypatch):
+    monkeypatch.setattr(live_event_pruner, '_last_pruned', None)
+    add_old_events(5, app.config['LIVE_EVENT_RETENTION'] + 60)
+    add_old_events(2, 10)
+    publish_event('status', ['queue:all'], ticket_id=1)
+    db.session.commit()
+    assert live_event_count() == 3 # The two recent events plus the new one
+    assert live_broker.subscriber_count() == 0
+
+def test_pruning_is_throttled_per_process(app, monkeypatch):
+    monkeypatch.setattr(live_event_pruner, '_last_pruned', None)
+    publish_event('status', ['queue:all'], ticket_id=1)
+    db.session.commit()
+    add_old_events(4, app.config['LIVE_EVENT_RETENTION'] + 60)
+    publish_event('status', ['queue:all'], ticket_id=1)
+    db.session.commit()
+    assert live_event_count() == 6 # Within a tenth of the retention of the last prune
+
+def test_prune_live_events_command(app):
+    add_old_events(3, app.config['LIVE_EVENT_RETENTION'] + 60)
+    result = app.test_cli_runner().invoke(args=['prune-live-events'])
+    assert 'Pruned 3 live event(s).' in result.output
+    assert live_event_count() == 0
@@ -0,0 +1,18 @@
+import pytest
+
+@pytest.mark.parametrize('config, headers, status', [
+    ({}, {}, 403), # No token: closed, even to loopback clients (a local reverse proxy looks like one)
+    ({'METRICS_TOKEN': 'secret'}, {}, 401),
+    ({'METRICS_TOKEN': 'secret'}, {'Authorization': 'Bearer wrong'}, 401),
+    ({'METRICS_TOKEN': 'secret'}, {'Authorization': 'Bearer secret'}, 200),
+    ({'METRICS_ALLOW_LOOPBACK': True}, {}, 200),
+], ids=['default', 'token-missing', 'token-wrong', 'token', 'loopback-opt-in'])
+def test_metrics_access(make_app, config, headers, status):
+    app = make_app(**config)
+    response = app.test_client().get('/metrics', headers=headers, environ_base={'REMOTE_ADDR': '127.0.0.1'})
+    assert response.status_code == status
+
+def test_loopback_opt_in_does_not_open_metrics_to_other_clients(make_app):
+    app = make_app(METRICS_ALLOW_LOOPBACK=True)
+    response = app.test_client().get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    assert response.status_code == 403
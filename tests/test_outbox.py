@@ -0,0 +1,136 @@
+import datetime
+import socket
+import threading
+import pytest
+from aiosmtpd.controller import Controller
+from app.extensions import db
+from app.models import NotificationOutbox
+from app.notifications import (
+    MailTransport, deliver_outbox_batch, enqueue_notification, purge_sent_notifications)
+
+class RecordingHandler:
+    """SMTP stand-in that records messages and answers the first `failures` DATA commands with a 451."""
+    def __init__(self):
+        self.messages = []
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                return '451 Requested action aborted: local error in processing'
+            self.messages.append(envelope.content.decode())
+        return '250 OK'
+
+    def subjects(self):
+        return [line.split(': ', 1)[1] for message in self.messages
+                for line in message.splitlines() if line.startswith('Subject: ')]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def smtp(make_app):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    app = make_app(MAIL_BACKEND='smtp', MAIL_SERVER='127.0.0.1', MAIL_PORT=controller.port,
+                   OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_BASE=30)
+    with app.app_context():
+        yield app, handler
+        db.session.remove()
+        db.engine.dispose()
+    controller.stop()
+
+def enqueue(count, kind='status_changed'):
+    for i in range(count):
+        enqueue_notification(i + 1, kind, f'user{i}@example.com', f'Notification {i}', 'body')
+    db.session.commit()
+
+def make_due():
+    # Skips the backoff wait instead of sleeping through it
+    db.session.execute(db.update(NotificationOutbox).where(NotificationOutbox.status == 'pending')
+                       .values(next_attempt_at=datetime.datetime.now() - datetime.timedelta(seconds=1)))
+    db.session.commit()
+
+def deliver(batch_size=None):
+    transport = MailTransport()
+    try:
+        return deliver_outbox_batch(transport, batch_size)
+    finally:
+        transport.close()
+
+def test_delivers_over_smtp(smtp):
+    app, handler = smtp
+    enqueue(3)
+    assert deliver() == (3, 0)
+    assert sorted(handler.subjects()) == ['Notification 0', 'Notification 1', 'Notification 2']
+    assert deliver() == (0, 0)
+
+def test_retries_after_transient_failure_with_backoff(smtp):
+    app, handler = smtp
+    handler.failures = 1
+    enqueue(1)
+    assert deliver() == (0, 1)
+    notification = db.session.scalars(db.select(NotificationOutbox)).one()
+    assert notification.status == 'pending' and notification.attempts == 1
+    assert '451' in notification.last_error
+    assert notification.next_attempt_at > datetime.datetime.now() + datetime.timedelta(seconds=25)
+    assert deliver() == (0, 0) # Not due yet
+    make_due()
+    assert deliver() == (1, 0)
+    assert handler.subjects() == ['Notification 0']
+
+def test_dead_letters_after_max_attempts(smtp):
+    app, handler = smtp
+    handler.failures = 100
+    enqueue(1)
+    for _ in range(app.config['OUTBOX_MAX_ATTEMPTS']):
+        assert deliver() == (0, 1)
+        make_due()
+    notification = db.session.scalars(db.select(NotificationOutbox)).one()
+    assert notification.status == 'failed'
+    assert notification.attempts == app.config['OUTBOX_MAX_ATTEMPTS']
+    assert deliver() == (0, 0)
+    assert handler.messages == []
+
+def test_concurrent_workers_send_each_notification_once(smtp):
+    app, handler = smtp
+    enqueue(60)
+    errors = []
+
+    def worker():
+        with app.app_context():
+            try:
+                while deliver(batch_size=5) != (0, 0):
+                    pass
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(handler.subjects()) == sorted(f'Notification {i}' for i in range(60))
+    assert db.session.scalar(db.select(db.func.count()).where(NotificationOutbox.status == 'sent')) == 60
+
+def test_purges_sent_rows_past_retention(smtp):
+    app, handler = smtp
+    enqueue(4)
+    assert deliver() == (4, 0)
+    enqueue(1, kind='comment')
+    old = datetime.datetime.now() - datetime.timedelta(days=app.config['OUTBOX_SENT_RETENTION_DAYS'] + 1)
+    db.session.execute(db.update(NotificationOutbox).where(NotificationOutbox.id.in_([1, 2]))
+                       .values(sent_at=old))
+    db.session.commit()
+    assert purge_sent_notifications(chunk_size=1) == 2
+    remaining = db.session.execute(db.select(NotificationOutbox.id, NotificationOutbox.status)
+                                   .order_by(NotificationOutbox.id)).all()
+    assert remaining == [(3, 'sent'), (4, 'sent'), (5, 'pending')]
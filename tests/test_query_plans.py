@@ -0,0 +1,48 @@
+import datetime
+import pytest
+from app.commands import QUERY_PLAN_ALLOWLIST, dashboard_query_shapes, explain_query_plan, table_scans
+from app.extensions import db
+from app.models import Category, Comment, Ticket, User
+
+def seed_tickets(users=20, agents=5, tickets=2000):
+    # Skewed like a real desk: few agents, most tickets Resolved/Closed, a long tail of unassigned ones
+    now = datetime.datetime.now()
+    statuses = ['Open', 'In Progress', 'Resolved', 'Resolved', 'Closed', 'Closed']
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+         'role': 'support_agent' if i <= agents else 'end_user'} for i in range(1, users + 1)])
+    db.session.execute(db.insert(Category), [{'id': i, 'name': f'category{i}'} for i in range(1, 6)])
+    db.session.execute(db.insert(Ticket), [
+        {'id': i, 'user_id': agents + 1 + i % (users - agents), 'category_id': 1 + i % 5, 'subject': 's',
+         'description': 'd', 'status': statuses[i % len(statuses)], 'comment_count': i % 7,
+         'assigned_agent_id': None if i % 3 == 0 else 1 + i % agents,
+         'created_at': now - datetime.timedelta(minutes=i), 'updated_at': now - datetime.timedelta(minutes=i)}
+        for i in range(1, tickets + 1)])
+    db.session.execute(db.insert(Comment), [
+        {'ticket_id': 1 + i % tickets, 'user_id': 1 + i % users, 'comment_text': 'c',
+         'created_at': now - datetime.timedelta(seconds=i)} for i in range(tickets * 3)])
+    db.session.commit()
+
+def test_table_scans_catches_index_walks():
+    assert table_scans(['SCAN ticket'])
+    assert table_scans(['SCAN ticket USING INDEX ix_ticket_updated'])
+    assert table_scans(['SCAN comment_archive'])
+    assert not table_scans(['SEARCH ticket USING INDEX ix_ticket_user_updated (user_id=?)'])
+    assert not table_scans(['SCAN category'])
+
+def test_allowlist_names_real_shapes(app):
+    labels = {label for label, _ in dashboard_query_shapes()}
+    assert QUERY_PLAN_ALLOWLIST <= labels
+
+@pytest.mark.parametrize('analyze', [False, True], ids=['fresh', 'analyzed'])
+def test_dashboard_queries_search_an_index(app, analyze):
+    if analyze:
+        seed_tickets()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('ANALYZE')
+    scans = {}
+    for label, statement in dashboard_query_shapes():
+        plan = explain_query_plan(statement)
+        if table_scans(plan) and label not in QUERY_PLAN_ALLOWLIST:
+            scans[label] = plan
+    assert not scans
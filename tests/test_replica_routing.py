@@ -0,0 +1,65 @@
+import time
+import pytest
+import sqlalchemy
+from flask import g, session
+from app.extensions import db, read_only
+from app.models import Category
+
+@pytest.fixture
+def replicated(make_app, tmp_path):
+    app = make_app(DATABASE_REPLICA_URL=f"sqlite:///{tmp_path / 'replica.db'}", SQLITE_BUSY_TIMEOUT=1234)
+    with app.app_context():
+        replica = db.engines['replica']
+        db.metadata.create_all(replica)
+        with replica.begin() as conn: # A row only the replica has, so reads show where they went
+            conn.execute(db.insert(Category).values(name='replica only'))
+        db.session.add(Category(name='primary only'))
+        db.session.commit()
+    yield app # Each test request gets its own app context (and g), as in production
+    with app.app_context():
+        db.engine.dispose()
+        replica.dispose()
+
+def names_on(engine):
+    with engine.connect() as conn:
+        return set(conn.execute(db.select(Category.name)).scalars())
+
+def category_names():
+    return {category.name for category in Category.query.all()}
+
+def test_read_only_views_read_from_the_replica(replicated):
+    with replicated.test_request_context():
+        assert read_only(category_names)() == {'replica only'}
+    with replicated.test_request_context():
+        assert category_names() == {'primary only'} # Views without @read_only stay on the primary
+
+def test_recent_writer_keeps_reading_the_primary(replicated):
+    with replicated.test_request_context():
+        session['primary_until'] = time.time() + 60
+        assert read_only(category_names)() == {'primary only'}
+
+def test_writes_and_flushes_go_to_the_primary(replicated):
+    with replicated.test_request_context():
+        g.read_replica = True
+        db.session.add(Category(name='new'))
+        db.session.flush()
+        # Primary key lookups of just-flushed rows and the commit stay on the primary too
+        db.session.commit()
+        db.session.execute(db.update(Category).where(Category.name == 'new').values(name='renamed'))
+        db.session.commit()
+    with replicated.app_context():
+        assert names_on(db.engine) == {'primary only', 'renamed'}
+        assert names_on(db.engines['replica']) == {'replica only'}
+
+def test_sqlite_pragmas_apply_to_this_apps_engines_only(replicated, tmp_path):
+    with replicated.app_context():
+        engines = [db.engine, db.engines['replica']]
+    for engine in engines: # Fresh connections outside any app context: the settings are bound to the listener
+        engine.dispose()
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == 1234
+            assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+    other = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    with other.connect() as conn: # Opened outside the app's engines: no listener, no current_app needed
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'delete'
+    other.dispose()
@@ -0,0 +1,60 @@
+import pytest
+from app.extensions import db
+from app.models import Category, Comment, Ticket, User
+from app.search import fts_query, index_comment_for_search, index_ticket_for_search
+
+@pytest.fixture
+def desk(app):
+    users = {name: User(username=name, email=f'{name}@example.com', password_hash='x', role=role)
+             for name, role in [('alice', 'end_user'), ('bob', 'end_user'), ('agent', 'support_agent')]}
+    db.session.add_all([*users.values(), Category(name='Billing')])
+    db.session.flush()
+    for owner, subject, reply in [('alice', 'Invoice shows the wrong amount', 'Refund issued for the invoice'),
+                                  ('bob', 'Printer jammed', 'Invoice attached for the new printer')]:
+        ticket = Ticket(user_id=users[owner].id, category_id=1, subject=subject, description='d', status='Open')
+        db.session.add(ticket)
+        db.session.flush()
+        comment = Comment(ticket_id=ticket.id, user_id=users['agent'].id, comment_text=reply)
+        db.session.add(comment)
+        db.session.flush()
+        index_ticket_for_search(ticket)
+        index_comment_for_search(comment, ticket)
+    db.session.commit()
+    return users
+
+def search(app, user, q):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    response = client.get('/search', query_string={'q': q})
+    assert response.status_code == 200
+    return response.get_json()['hits']
+
+def test_ticket_hit(app, desk):
+    [hit] = search(app, desk['agent'], 'jammed')
+    assert hit['subject'] == 'Printer jammed'
+    assert hit['comment_id'] is None
+    assert '<mark>jammed</mark>' in hit['snippet']
+
+def test_comment_hit(app, desk):
+    [hit] = search(app, desk['agent'], 'refund')
+    assert hit['subject'] == 'Invoice shows the wrong amount'
+    assert hit['comment_id'] is not None
+
+def test_agents_see_every_ticket(app, desk):
+    assert {hit['subject'] for hit in search(app, desk['agent'], 'invoice')} == {
+        'Invoice shows the wrong amount', 'Printer jammed'}
+
+def test_end_users_only_see_their_own_tickets(app, desk):
+    # Bob's ticket has a comment mentioning an invoice too
+    assert {hit['subject'] for hit in search(app, desk['alice'], 'invoice')} == {'Invoice shows the wrong amount'}
+
+@pytest.mark.parametrize('text, expected', [
+    ('', None), ('"*-:()', None), ('NOT AND', '"NOT" "AND"*'), ('invo', '"invo"*'),
+])
+def test_fts_query_quotes_user_input(text, expected):
+    assert fts_query(text) == expected
+
+def test_punctuation_only_search_has_no_hits(app, desk):
+    assert search(app, desk['agent'], '"*-:()') == []
@@ -0,0 +1,46 @@
+import datetime
+import numpy as np
+import pytest
+from app.analytics import histogram_percentiles, roll_up_sla_events, sla_histogram
+from app.extensions import db
+from app.models import TicketEvent, User
+
+# One resolution per minute of delay, 1 to 100 minutes: p50 is 50.5 minutes and p90 90.1 minutes
+RESOLUTION_SECONDS = [60.0 * minutes for minutes in range(1, 101)]
+BIN_WIDTH = 0.15 # SLA_HISTOGRAM_BINS log-spaced bins are about 14% wide
+
+@pytest.fixture
+def rolled_up(app):
+    occurred_at = datetime.datetime.now() - datetime.timedelta(days=1)
+    db.session.add_all([TicketEvent(ticket_id=i, kind='status', from_status='Open', to_status='Resolved',
+                                    category_id=1, elapsed_seconds=seconds, occurred_at=occurred_at)
+                        for i, seconds in enumerate(RESOLUTION_SECONDS)])
+    # Neither opens nor resolves anything, so it is read but not counted
+    db.session.add(TicketEvent(ticket_id=1, kind='status', from_status='Open', to_status='In Progress',
+                               category_id=1, elapsed_seconds=1.0, occurred_at=occurred_at))
+    db.session.commit()
+    assert roll_up_sla_events() == len(RESOLUTION_SECONDS) + 1
+    assert roll_up_sla_events() == 0 # The cursor moved past every event
+
+def test_histogram_percentiles_of_known_durations(app):
+    p50, p90 = histogram_percentiles(sla_histogram(np.asarray(RESOLUTION_SECONDS)), [0.5, 0.9])[0]
+    assert p50 == pytest.approx(np.percentile(RESOLUTION_SECONDS, 50), rel=BIN_WIDTH)
+    assert p90 == pytest.approx(np.percentile(RESOLUTION_SECONDS, 90), rel=BIN_WIDTH)
+
+def test_sla_report_reads_the_rollup(app, rolled_up):
+    agent = User(username='agent', email='agent@example.com', password_hash='x', role='support_agent')
+    db.session.add(agent)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(agent.id)
+        session['_fresh'] = True
+    report = client.get('/reports/sla', query_string={'days': 7}).get_json()
+    assert report['granularity'] == 'day'
+    assert report['first_response']['overall'] == {}
+    overall = report['resolution']['overall']['0']
+    assert overall['count'] == len(RESOLUTION_SECONDS)
+    assert overall['mean'] == pytest.approx(np.mean(RESOLUTION_SECONDS))
+    p50, p90, _ = overall['percentiles']
+    assert p50 == pytest.approx(np.percentile(RESOLUTION_SECONDS, 50), rel=BIN_WIDTH)
+    assert p90 == pytest.approx(np.percentile(RESOLUTION_SECONDS, 90), rel=BIN_WIDTH)
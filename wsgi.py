@@ -0,0 +1,15 @@
+# wsgi.py
+# Production entry point: `gunicorn -k gevent --preload wsgi:app`. /events streams stay open for as long
+# as the page does, so the workers must be cooperative: under gevent an idle stream holds a greenlet, not
+# one of a handful of sync-worker threads. create_app() opens no database connections, so with --preload
+# the master imports the code once and forked workers start without repeating it.
+# Development: `flask --app app run --debug`. Create or migrate the schema first with `flask --app app init`.
+from gevent import monkey
+
+# Patched before the app is imported, so the locks, queues and the live-event broker thread created
+# at import time in the preloading master are greenlet-aware in every worker
+monkey.patch_all()
+
+from app import create_app
+
+app = create_app()